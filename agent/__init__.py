@@ -1,2 +1,2 @@
 from .indexing_agent import background_audit_chunks, background_evaluation_agent
-from .chat_agent import chat_agent
\ No newline at end of file
+from .chat_agent import chat_agent, chat_agent_stream
\ No newline at end of file
@@ -1,29 +1,30 @@
 import json
+import asyncio
+from typing import AsyncIterator
 from vector_db import search_documents
 from llm import responses, prompt_template
-import json
 from chat_history import get_chat_history
 import logging
+import os
+import time
+import dotenv
 from agent import background_evaluation_agent
+from .chat_context import ChatContext
+from .request_budget import RequestBudget, CHAT_REQUEST_TIMEOUT
+
+dotenv.load_dotenv()
+
+CHAT_FAST_MODE = os.environ.get("CHAT_FAST_MODE", "true").lower() == "true"
+CHAT_FAST_MODE_SCORE_THRESHOLD = float(os.environ.get("CHAT_FAST_MODE_SCORE_THRESHOLD", 0.7))
+CHAT_FAST_MODE_LIMIT = int(os.environ.get("CHAT_FAST_MODE_LIMIT", 5))
+CHAT_AGENT_MAX_ATTEMPTS = int(os.environ.get("CHAT_AGENT_MAX_ATTEMPTS", 15))
 
 logger = logging.getLogger(__name__)
 
 AUDIT_CHUNK_AGENT_SYSTEM_PROMPT = """
 you are a tool using agent.
-only return JSON formatted response not markdown no extra text.
-
-tools you can use:
-{tools_list}
-
-only respond in one of the following JSON formats:
-1) tool call:
-a. get document
-{"type": "tool_call", "tool_name": "search_documents"|"get_chat_history", "arguments": {...}, "reasoning": "..."}
-
-2) final:
-only call if you finish
-{"type": "final", "final_answer":"..."}
-fill final_search_document_arguments if context found and used, else fill with empty string "", make sure the argument is in JSON format.
+call the provided tools when you need document context or chat history, you can call several tools at once.
+when you have enough context, answer the user directly in plain text without calling any tool.
 
 if you found an error while using the tools, don't mention to user.
 """
@@ -32,144 +33,291 @@ AUDIT_CHUNK_AGENT_PROMPT = """
 You are a chat bot agent that answer question with context provided by document
 
 ritrieve document until you make sure get the right context to answer the question.
-decide the query text to ritrieve document to get better result and give why you deciced on reasoning
-decide number of limit document to be ritrieved based on the question and give why you deciced on reasoning
+decide the query text to ritrieve document to get better result
+decide number of limit document to be ritrieved based on the question
 document are chunking smally so you can start with big limit
 
 only use ritrieval tool if you need, if you can answer right away dont use it.
 
 you also can use chat history tool to understand what user question context about.
 
-user tenant:
-{tenant}
-user id:
-{user_id}
 user question:
 {query}
 """
 
+GROUNDED_ANSWER_SYSTEM_PROMPT = """
+you are a chat bot that answer the user question using only the provided documents.
+answer directly in plain text. if the documents don't contain the answer, say you don't know.
+"""
+
+GROUNDED_ANSWER_PROMPT = """
+Documents:
+{documents}
+
+user question:
+{query}
+"""
+
+FORCED_ANSWER_PROMPT = """
+there is no time left to use tools. answer the user question now in plain text
+using only the documents and chat history already provided, if they don't contain the answer, say you don't know.
+
+user question:
+{query}
+"""
 
-VECTOR_DB_TOOLS = [
+# tenant and user id are filled by the agent, not by the model
+CHAT_AGENT_TOOLS = [
     {
-    "tool_name": "search_documents",
-    "description": "use for retrieving document from the vector database",
-    "argument": {
-        "query": "string of the question you can adjust",
-        "tenant": "string of user tenant",
-        "limit": "int of document limit ritrival you can adjust"
+        "type": "function",
+        "function": {
+            "name": "search_documents",
+            "description": "use for retrieving document from the vector database",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "query": {"type": "string", "description": "the question you can adjust for better retrieval"},
+                    "limit": {"type": "integer", "description": "number of documents to retrieve"}
+                },
+                "required": ["query"]
+            }
         }
     },
     {
-    "tool_name": "get_chat_history",
-    "description": "use for geting chat history",
-    "argument": {
-        "tenant": "string of user tenant",
-        "user_id": "string of user id",
-        "limit": "int of latest n chat history"
+        "type": "function",
+        "function": {
+            "name": "get_chat_history",
+            "description": "use for geting chat history",
+            "parameters": {
+                "type": "object",
+                "properties": {
+                    "limit": {"type": "integer", "description": "number of latest chat history messages"}
+                },
+                "required": []
+            }
         }
     }
 ]
 
+async def search_documents_tool(tenant:str, user_id:str, query:str, limit:int = 5, timeout:float | None = None):
+    return await search_documents(query=query, tenant=tenant, limit=int(limit), timeout=timeout)
+
+async def get_chat_history_tool(tenant:str, user_id:str, limit:int = 10, timeout:float | None = None):
+    return await asyncio.wait_for(get_chat_history(tenant=tenant, user_id=user_id, limit=int(limit)), timeout)
+
 TOOLS = {
-    "search_documents": search_documents,
-    "get_chat_history": get_chat_history
+    "search_documents": search_documents_tool,
+    "get_chat_history": get_chat_history_tool
 }
 
-def safe_json_loads(content: str):
+async def call_tool(tool_name:str, arguments:dict, tenant:str, user_id:str, timeout:float | None = None):
     try:
-        content.strip()
-        return json.loads(content)
-    except:
-        content = content.replace("\r\n", "\\n").replace("\n", "\\n").replace("\r", "\\n")
-        try:
-            return json.loads(content)
-        except json.JSONDecodeError:
-            start = content.find("{")
-            end = content.rfind("}")
-            if start == -1 or end == -1:
-                raise ValueError(f"No JSON found in model output:\n{content}")
-            return json.loads(content[start:end+1])
-    
-# for higher model usage
-async def chat_agent(message, tenant, user_id, model) -> str:
+        if tool_name not in TOOLS:
+            raise ValueError(f"Tool {tool_name} not found")
+
+        arguments = {key: value for key, value in arguments.items() if key not in ("tenant", "user_id", "timeout")}
+        return await TOOLS[tool_name](tenant=tenant, user_id=user_id, timeout=timeout, **arguments)
+    except TimeoutError:
+        logger.warning(f"Tool {tool_name} timed out after {timeout}s")
+        return "Error Happen when calling tool: timed out"
+    except Exception as e:
+        logger.error(f"Error when calling tool {tool_name} with arguments {arguments}: {e}")
+        return f"Error Happen when calling tool: {e}"
+
+async def stream_answer(context:ChatContext, model:str, attempt:int, budget:RequestBudget, step:str) -> AsyncIterator[dict]:
+    """
+    Stream a tool-free answer as token events within what is left of the request budget
+    """
+    started_at = time.monotonic()
+    try:
+        async for part in await responses(message=context.messages, model=model, stream=True, timeout=budget.remaining(reserve=False)):
+            part_content = part['message']['content'] or ""
+            if part_content:
+                yield {"type": "token", "content": part_content, "attempt": attempt}
+            if part.done:
+                context.record_usage(part)
+    except TimeoutError:
+        logger.warning(f"{step} answer cut at the request deadline")
+        budget.deadline_exceeded = True
+    finally:
+        budget.record(step, started_at)
+
+async def chat_agent_stream(message, tenant, user_id, model, fast_mode:bool | None = None, timeout:float | None = None) -> AsyncIterator[dict]:
+    """
+    Agent loop yielding progress events: tool_call, documents, token and a last final event with the result.
+    Token events stream the text of a turn until it calls a tool. A turn that calls a tool after some
+    of its text was sent is followed by a turn_discarded event, so clients drop that partial text.
+    In fast mode the raw question is searched first, a confident hit is answered with one grounded call,
+    otherwise the agent loop starts with those documents already in context.
+    timeout is the request budget in seconds, when the loop runs out of it the answer is forced from the retrieved documents.
+    """
     logger.info("agent chat starting")
-    system_prompt = prompt_template(AUDIT_CHUNK_AGENT_SYSTEM_PROMPT, {
-        "tools_list": str(VECTOR_DB_TOOLS)
-    })
+    if fast_mode is None:
+        fast_mode = CHAT_FAST_MODE
+    budget = RequestBudget(timeout or CHAT_REQUEST_TIMEOUT)
+    system_prompt = prompt_template(AUDIT_CHUNK_AGENT_SYSTEM_PROMPT, {})
 
     agent_prompt = prompt_template(AUDIT_CHUNK_AGENT_PROMPT, {
-        "tenant": tenant,
-        "user_id": user_id,
         "query": message
     })
 
-    message = [{
+    context = ChatContext([{
         "role": "system",
         "content": system_prompt
     }, {
         "role": "user",
         "content": agent_prompt
-    }]
+    }])
 
-    
     final_answer = ""
     final_document = []
-    token_usage_estimation = 0
+    answer_mode = "agent"
+    answered = False
+
+    if fast_mode:
+        started_at = time.monotonic()
+        try:
+            prefetched_documents = await search_documents(query=message, tenant=tenant, limit=CHAT_FAST_MODE_LIMIT, timeout=budget.remaining())
+        except Exception as e:
+            logger.error(f"Fast mode retrieval failed, using the agent loop: {e}")
+            prefetched_documents = []
+        budget.record("retrieval", started_at)
+
+        if prefetched_documents and prefetched_documents[0]["score"] >= CHAT_FAST_MODE_SCORE_THRESHOLD:
+            answer_mode = "fast"
+            answered = True
+            final_document = prefetched_documents
+            yield {"type": "documents", "chunk_ids": [document["chunk_id"] for document in prefetched_documents]}
+
+            context = ChatContext([{
+                "role": "system",
+                "content": prompt_template(GROUNDED_ANSWER_SYSTEM_PROMPT, {})
+            }, {
+                "role": "user",
+                "content": prompt_template(GROUNDED_ANSWER_PROMPT, {
+                    "documents": json.dumps(prefetched_documents),
+                    "query": message
+                })
+            }])
+
+            async for event in stream_answer(context, model, 1, budget, "llm"):
+                final_answer += event["content"]
+                yield event
+
+        elif prefetched_documents:
+            context.append({
+                "role": "assistant",
+                "content": "",
+                "tool_calls": [{"function": {"name": "search_documents", "arguments": {"query": message, "limit": CHAT_FAST_MODE_LIMIT}}}]
+            })
+            new_documents = context.add_tool_result("search_documents", prefetched_documents)
+            final_document.extend(new_documents)
+            yield {"type": "documents", "chunk_ids": [document["chunk_id"] for document in new_documents]}
 
     attempt = 0
-    limit_attempt = 15
-    while attempt < limit_attempt:
+    while not answered and attempt < CHAT_AGENT_MAX_ATTEMPTS:
+        if budget.expired:
+            budget.deadline_exceeded = True
+            break
+
         attempt += 1
         logger.info(f"attempt {attempt}")
 
-        content = await responses(message=message, model=model)
-        token_usage_estimation += content.eval_count
+        content = ""
+        streamed = False
+        tool_calls = []
+        started_at = time.monotonic()
+        try:
+            async for part in await responses(message=context.messages, model=model, tools=CHAT_AGENT_TOOLS, stream=True, timeout=budget.remaining()):
+                part_content = part['message']['content'] or ""
+                if part_content:
+                    content += part_content
+                    if not tool_calls:
+                        streamed = True
+                        yield {"type": "token", "content": part_content, "attempt": attempt}
+                for tool_call in part['message'].get('tool_calls') or []:
+                    tool_calls.append({
+                        "function": {
+                            "name": tool_call['function']['name'],
+                            "arguments": dict(tool_call['function']['arguments'] or {})
+                        }
+                    })
+                if part.done:
+                    context.record_usage(part)
+        except TimeoutError:
+            logger.warning(f"attempt {attempt} cut at the request deadline")
+            budget.deadline_exceeded = True
+            if streamed:
+                yield {"type": "turn_discarded", "attempt": attempt}
+            break
+        finally:
+            budget.record("llm", started_at)
 
-        action = safe_json_loads(content['message']['content'])
+        if not tool_calls:
+            logger.info("Chat Agent Finish")
+            final_answer = content
+            answered = True
+            break
 
-        if action["type"] == "tool_call":
-            logger.info("action:", action)
-            try:
-                tool_name = action["tool_name"]
+        if streamed:
+            yield {"type": "turn_discarded", "attempt": attempt}
 
-                if tool_name not in TOOLS:
-                    raise ValueError(f"Tool {tool_name} not found")
-                
-                tool_result = await TOOLS[tool_name](**action["arguments"])
-                action["tool_result"] = tool_result
+        context.append({
+            "role": "assistant",
+            "content": content,
+            "tool_calls": tool_calls
+        })
 
-                logger.debug
-                        
-            except Exception as e:
-                tool_result = f"Error Happen when calling tool: {e}"
-                logger.error(f"Error when calling tool {action["tool_name"]} with arguments {action["arguments"]}: {e}")
+        for tool_call in tool_calls:
+            logger.info(f"Tool called: {tool_call['function']['name']}, with arguments: {tool_call['function']['arguments']}")
+            yield {"type": "tool_call", "tool_name": tool_call['function']['name'], "arguments": tool_call['function']['arguments']}
+
+        started_at = time.monotonic()
+        tool_results = await asyncio.gather(*[
+            call_tool(tool_call['function']['name'], tool_call['function']['arguments'], tenant, user_id, timeout=budget.remaining())
+            for tool_call in tool_calls
+        ])
+        budget.record("tools", started_at)
+
+        for tool_call, tool_result in zip(tool_calls, tool_results):
+            tool_name = tool_call['function']['name']
+            new_documents = context.add_tool_result(tool_name, tool_result)
+
+            if new_documents:
+                final_document.extend(new_documents)
+                yield {"type": "documents", "chunk_ids": [document["chunk_id"] for document in new_documents]}
+
+    if not answered:
+        logger.info("Chat Agent out of budget, forcing the final answer")
+        answer_mode = "forced"
+        context.append({
+            "role": "user",
+            "content": prompt_template(FORCED_ANSWER_PROMPT, {"query": message})
+        })
+        async for event in stream_answer(context, model, attempt + 1, budget, "final_answer"):
+            final_answer += event["content"]
+            yield event
 
-            message.append({
-                "role": "assistant",
-                "content": json.dumps(tool_result)
-            })
-            message.append({
-                "role": "user",
-                "content": json.dumps({
-                    "tool_name": action["tool_name"],
-                    "arguments": action["arguments"],
-                    "tool_result": tool_result
-                    })
-            })
-            logger.info(f"Tool called: {action["tool_name"]}, with arguments: {action["arguments"]}")
-
-            if tool_name == "search_documents":
-                final_document.extend(tool_result)
-            
-        elif action["type"] == "final":
-            logger.info("Chat Agent Finish with action:", json.dumps(action))
-            final_answer = action["final_answer"]
-            break
-    
     try:
-        background_evaluation_agent.delay(question=message, documents=final_document)
+        background_evaluation_agent.delay(question=context.messages, documents=final_document)
     except Exception as e:
         logger.error(f"Error Whe publishing task Background Evaluation Agent: {e}")
 
     logger.info("agent chat stop")
-    return {"final_answer": final_answer, "final_documents": final_document, "final_prompt": message, "token_usage_estimation": token_usage_estimation}
\ No newline at end of file
+    yield {
+        "type": "final",
+        "final_answer": final_answer,
+        "final_documents": final_document,
+        "final_prompt": context.messages,
+        "token_usage_estimation": context.prompt_tokens + context.completion_tokens,
+        "prompt_tokens": context.prompt_tokens,
+        "completion_tokens": context.completion_tokens,
+        "answer_mode": answer_mode,
+        "time_budget": budget.report()
+    }
+
+# for higher model usage
+async def chat_agent(message, tenant, user_id, model, fast_mode:bool | None = None, timeout:float | None = None) -> dict:
+    async for event in chat_agent_stream(message=message, tenant=tenant, user_id=user_id, model=model, fast_mode=fast_mode, timeout=timeout):
+        if event["type"] == "final":
+            return {key: value for key, value in event.items() if key != "type"}
@@ -0,0 +1,112 @@
+import json
+import os
+import logging
+import dotenv
+from chunking import count_tokens
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHAT_CONTEXT_TOKEN_BUDGET = int(os.environ.get("CHAT_CONTEXT_TOKEN_BUDGET", 6000))
+
+# role and formatting tokens added by the chat template around every message
+MESSAGE_OVERHEAD_TOKENS = 4
+
+class ChatContext:
+    """
+    Message list of the chat agent loop with a token budget.
+    Retrieved chunks are sent once per conversation, and when the budget is exceeded the oldest
+    tool outputs are replaced by short summaries, the latest turn is always kept whole.
+    """
+    def __init__(self, messages:list[dict], token_budget:int = CHAT_CONTEXT_TOKEN_BUDGET):
+        self.token_budget = token_budget
+        self.messages = []
+        self.token_counts = []
+        self.compacted = set()
+        self.seen_chunk_ids = set()
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        for message in messages:
+            self.append(message)
+
+    @staticmethod
+    def count(message:dict) -> int:
+        text = message.get("content") or ""
+        if message.get("tool_calls"):
+            text += json.dumps(message["tool_calls"])
+        return count_tokens([text])[0] + MESSAGE_OVERHEAD_TOKENS
+
+    @property
+    def total_tokens(self) -> int:
+        return sum(self.token_counts)
+
+    def append(self, message:dict):
+        self.messages.append(message)
+        self.token_counts.append(self.count(message))
+
+    def add_tool_result(self, tool_name:str, tool_result) -> list:
+        """
+        Append a tool output, search results drop chunks already in the context.
+        Returns the documents that are new to this conversation.
+        """
+        new_documents = []
+        content = tool_result
+        if tool_name == "search_documents" and isinstance(tool_result, list):
+            repeated_chunk_ids = []
+            for document in tool_result:
+                # neighbor windows cover several chunks and are repeated only when all of them were sent
+                chunk_ids = set(document.get("chunk_ids") or [document["chunk_id"]])
+                if chunk_ids <= self.seen_chunk_ids:
+                    repeated_chunk_ids.append(document["chunk_id"])
+                else:
+                    self.seen_chunk_ids.update(chunk_ids)
+                    new_documents.append(document)
+            content = new_documents
+            if repeated_chunk_ids:
+                content = {"documents": new_documents, "already_provided_chunk_ids": repeated_chunk_ids}
+
+        self.append({
+            "role": "tool",
+            "tool_name": tool_name,
+            "content": json.dumps(content)
+        })
+        self.enforce_budget()
+        return new_documents
+
+    def record_usage(self, response):
+        self.prompt_tokens += response.prompt_eval_count or 0
+        self.completion_tokens += response.eval_count or 0
+
+    def summarize(self, message:dict) -> str:
+        try:
+            content = json.loads(message["content"])
+        except (TypeError, ValueError):
+            content = message["content"]
+
+        if isinstance(content, dict) and "documents" in content:
+            content = content["documents"]
+        if message.get("tool_name") == "search_documents" and isinstance(content, list):
+            previews = [f"{document['chunk_id']}: {document.get('text', '')[:100]}" for document in content]
+            return json.dumps({"summary": "older search result shortened to save context", "documents": previews})
+        return json.dumps({"summary": "older tool result shortened to save context", "preview": str(content)[:200]})
+
+    def enforce_budget(self):
+        if self.total_tokens <= self.token_budget:
+            return
+
+        last_assistant = max(
+            (idx for idx, message in enumerate(self.messages) if message["role"] == "assistant"),
+            default=len(self.messages)
+        )
+        for idx in range(last_assistant):
+            message = self.messages[idx]
+            if message["role"] != "tool" or idx in self.compacted:
+                continue
+            self.messages[idx] = {**message, "content": self.summarize(message)}
+            self.token_counts[idx] = self.count(self.messages[idx])
+            self.compacted.add(idx)
+            if self.total_tokens <= self.token_budget:
+                break
+
+        logger.info(f"chat context at {self.total_tokens} estimated tokens, budget {self.token_budget}")
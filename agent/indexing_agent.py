@@ -1,16 +1,25 @@
 import json
-from vector_db import update_point_sync, get_point_sync
-from llm import responses_sync, prompt_template
+from vector_db import update_points_sync, set_payloads_sync, get_points_sync, document_collection_name
+from llm import responses_sync, prompt_template, discard_cached_response
 import json
 import logging
 from background_tasks import celery_app
+from background_tasks.fair_scheduling import acquire_tenant_tokens, record_enqueued, record_started, record_finished
+from background_tasks.job_progress import record_progress_sync
+from celery import group
+import time
 import dotenv
 import os
 from typing import List
+from collections import deque
 
 dotenv.load_dotenv()
 
 OLLAMA_INDEXING_AGENT_MODEL = os.environ.get('OLLAMA_INDEXING_AGENT_MODEL')
+AUDIT_MODE = os.environ.get('AUDIT_MODE', 'document')
+AUDIT_LOOK_BACK_WINDOW = int(os.environ.get('AUDIT_LOOK_BACK_WINDOW', 1))
+AUDIT_DOCUMENT_SLICE_SIZE = int(os.environ.get('AUDIT_DOCUMENT_SLICE_SIZE', 32))
+AUDIT_CHUNKS_PER_TASK = int(os.environ.get('AUDIT_CHUNKS_PER_TASK', 8))
 
 logger = logging.getLogger(__name__)
 
@@ -79,45 +88,106 @@ def safe_json_loads(content:str) -> dict:
                 raise ValueError(f"No JSON found in model output:\n{content}")
             return json.loads(content[start:end+1])
 
-def background_audit_chunks(tenant, doc_id, num_chunks):
-    for chunk_idx in range(num_chunks):
-        audit_chunk.delay(tenant=tenant, doc_id=doc_id, chunk_idx=chunk_idx)
+def agent_action(message:list[dict]) -> dict:
+    """
+    JSON action of the indexing model. Responses are cached by prompt so re-indexing an unchanged
+    document costs no LLM time, a response that isn't valid JSON is dropped so the next run asks again.
+    """
+    response = responses_sync(message=message, model=OLLAMA_INDEXING_AGENT_MODEL, cache=True)
+    try:
+        return safe_json_loads(response['message']['content'])
+    except Exception:
+        discard_cached_response(message, OLLAMA_INDEXING_AGENT_MODEL)
+        raise
+
+def background_audit_chunks(tenant, doc_id, num_chunks, audit_indices:List[int] | None = None, job_id:str | None = None):
+    """
+    Publish audit work for a document to the audit queue, one message per document slice
+    in document mode or one message per AUDIT_CHUNKS_PER_TASK chunks in chunk mode.
+    audit_indices limits the audit to the chunks a re-upload changed, all chunks by default.
+    Audited chunks are counted on the ingestion job when job_id is given.
+    """
+    if audit_indices is None:
+        audit_indices = list(range(num_chunks))
+    audit_indices = sorted(audit_indices)
+    if not audit_indices:
+        return
+    record_enqueued(tenant, "audit", len(audit_indices))
+
+    if AUDIT_MODE == "document":
+        # the walk starts a look-back window before the first changed chunk so it has its previous text
+        audit_document.delay(
+            tenant=tenant,
+            doc_id=doc_id,
+            num_chunks=audit_indices[-1] + 1,
+            start_idx=max(audit_indices[0] - AUDIT_LOOK_BACK_WINDOW, 0),
+            audit_indices=None if len(audit_indices) == num_chunks else audit_indices,
+            job_id=job_id,
+            enqueued_at=time.time()
+        )
+        return
+
+    group(
+        audit_chunk_batch.s(
+            tenant=tenant,
+            doc_id=doc_id,
+            chunk_indices=audit_indices[start:start + AUDIT_CHUNKS_PER_TASK],
+            job_id=job_id,
+            enqueued_at=time.time()
+        )
+        for start in range(0, len(audit_indices), AUDIT_CHUNKS_PER_TASK)
+    ).apply_async()
+
+def audited_payload(payload:dict, audited_text:str) -> dict:
+    """
+    Final payload of an enriched chunk, text is what gets embedded and returned by search
+    """
+    return {
+        **payload,
+        "text": f"{audited_text}\n{payload.get('original_text', '')}",
+        "audited_text": audited_text,
+        "audit_status": "audited",
+        "audit_version": str(int(payload.get("audit_version", 0) or 0) + 1)
+    }
 
 @celery_app.task(name="audit_chunk", bind=True)
 def audit_chunk(self, tenant:str, doc_id:str, chunk_idx:int, addtional_prompt:str=""):
     """
-    This agent will iterate every previous chunks and 1 next chunk to add more context to original text chunk
+    This agent will iterate every previous chunks and 1 next chunk to add more context to original text chunk.
+    All chunks are fetched in one call and the enriched chunk is written once at the end.
     """
     current_chunk_id = f"{tenant}:{doc_id}:{chunk_idx}"
-    collection_name = f"tenants_{tenant}_documents"
+    collection_name = document_collection_name(tenant)
 
     system_prompt = prompt_template(AUDIT_CHUNK_SYSTEM_PROMPT, {})
 
     logger.info(f"auditing {current_chunk_id}")
-    audit = False
-    for id in [*range(chunk_idx, 0, -1), chunk_idx+1]:
-        targeted_chunk = get_point_sync(chunk_id=current_chunk_id, collection_name=collection_name)
-        targeted_chunk_payload = targeted_chunk[0].payload
-        targeted_original_chunk_text = targeted_chunk_payload.get("original_text", "")
-        targeted_audited_chunk_text = targeted_chunk_payload.get("audited_text", "")
+    neighbor_ids = [*range(chunk_idx, 0, -1), chunk_idx+1]
+    chunks = get_points_sync(
+        chunk_ids=[current_chunk_id, *[f"{tenant}:{doc_id}:{id}" for id in neighbor_ids]],
+        collection_name=collection_name
+    )
+    if current_chunk_id not in chunks:
+        logger.error(f"chunk {current_chunk_id} not found")
+        return {"audit": "skipped"}
+    targeted_chunk_payload = chunks[current_chunk_id]
+    targeted_original_chunk_text = targeted_chunk_payload.get("original_text", "")
+    targeted_audited_chunk_text = targeted_chunk_payload.get("audited_text", "")
 
+    audit = False
+    for id in neighbor_ids:
         previous_chunk_id = f"{tenant}:{doc_id}:{id}"
 
         logger.info(f"analyzing {previous_chunk_id}")
-        
-        try:
-            previous_chunk = get_point_sync(
-                chunk_id=previous_chunk_id, 
-                collection_name=collection_name
-            )
-        except Exception as e:
+
+        if previous_chunk_id not in chunks:
             if id == chunk_idx+1:
-                logger.error(f"found error, next chunk may not exist: {e}")
+                logger.info(f"next chunk {previous_chunk_id} does not exist")
             else:
-                logger.error(f"found error while getting chunk with error detail: {e}")
+                logger.error(f"chunk {previous_chunk_id} not found")
             continue
 
-        previous_original_chunk_text = previous_chunk[0].payload.get("original_text", "")
+        previous_original_chunk_text = chunks[previous_chunk_id].get("original_text", "")
         agent_prompt = prompt_template(AUDIT_CHUNK_PROMPT, {
             "previous_original_chunk_text": previous_original_chunk_text,
             "targeted_audited_chunk_text": targeted_audited_chunk_text,
@@ -133,61 +203,249 @@ def audit_chunk(self, tenant:str, doc_id:str, chunk_idx:int, addtional_prompt:st
             "content": agent_prompt
         }]
 
-        response = responses_sync(message=message, model=OLLAMA_INDEXING_AGENT_MODEL)
-
-        action = safe_json_loads(response['message']['content'])
+        action = agent_action(message)
 
         logger.info("action: %s", action)
 
         if action["audit"] in ['True', 1, "true"]:
-            action['update_point'] = {
-                "chunk_id": f"{current_chunk_id}",
-                "collection_name": f"{collection_name}",
-                "payload": {
-                    "chunk_id": f"{current_chunk_id}",
-                    "tenant": tenant,
-                    "doc_id": doc_id,
-                    "index": chunk_idx,
-                    "title": targeted_chunk_payload.get("title", ""),
-                    "text": targeted_chunk_payload.get("text", ""),
-                    "original_text": targeted_chunk_payload.get("original_text", ""),
-                    "audited_text": f"{targeted_chunk_payload.get('audited_text', '')}\n\n{action.get('additional_context', '')}",
-                    "audit_status": targeted_chunk_payload.get("audit_status", ""),
-                    "audit_version": targeted_chunk_payload.get("audit_version", "")
-                }
-            }
-            update_point_sync(**action["update_point"])
+            targeted_audited_chunk_text = f"{targeted_audited_chunk_text}\n\n{action.get('additional_context', '')}"
             audit = True
 
             logger.info("Audited text updated")
         else:
             logger.info("No need to update text")
-        
+
     if audit:
-        targeted_chunk = get_point_sync(chunk_id=current_chunk_id, collection_name=collection_name)
-        targeted_chunk_payload = targeted_chunk[0].payload
-        action['update_point'] = {
-                "chunk_id": f"{current_chunk_id}",
-                "collection_name": f"{collection_name}",
-                "payload": {
-                    "chunk_id": f"{current_chunk_id}",
-                    "tenant": tenant,
-                    "doc_id": doc_id,
-                    "index": chunk_idx,
-                    "title": targeted_chunk_payload.get("title", ""),
-                    "text": f"{targeted_chunk_payload.get('audited_text', '')}\n{targeted_chunk_payload['original_text']}",
-                    "original_text": targeted_chunk_payload.get("original_text", ""),
-                    "audited_text": targeted_chunk_payload.get("audited_text", ""),
-                    "audit_status":"audited",
-                    "audit_version": str(int(targeted_chunk_payload.get("audit_version", 0) or 0) + 1)
-                }
-            }
-        update_point_sync(**action["update_point"])
+        update_points_sync(
+            collection_name=collection_name,
+            payloads=[audited_payload(targeted_chunk_payload, targeted_audited_chunk_text)]
+        )
+    else:
+        set_payloads_sync(collection_name=collection_name, payloads=[{"chunk_id": current_chunk_id, "audit_status": "audited"}])
 
     return {"audit": "finish"}
    
 
 
+@celery_app.task(name="audit_chunk_batch", bind=True, max_retries=None)
+def audit_chunk_batch(self, tenant:str, doc_id:str, chunk_indices:List[int], addtional_prompt:str="", enqueued_at:float | None=None, job_id:str | None=None):
+    """
+    Run audit_chunk for several chunks in one task, waits for the tenant token bucket before starting
+    """
+    wait = acquire_tenant_tokens(tenant, "audit", len(chunk_indices))
+    if wait:
+        raise self.retry(countdown=wait)
+    record_started(tenant, "audit", enqueued_at)
+
+    try:
+        for chunk_idx in chunk_indices:
+            try:
+                audit_chunk(tenant=tenant, doc_id=doc_id, chunk_idx=chunk_idx, addtional_prompt=addtional_prompt)
+            except Exception as e:
+                logger.error(f"found error while auditing {tenant}:{doc_id}:{chunk_idx} with error detail: {e}")
+    finally:
+        record_finished(tenant, "audit", len(chunk_indices))
+        record_progress_sync(job_id, "chunks_audited", len(chunk_indices))
+
+    return {"audit": "finish"}
+
+
+############################################## AUDIT DOCUMENT AGENT ###############################################
+
+AUDIT_DOCUMENT_SYSTEM_PROMPT = """
+only return JSON formatted response not markdown no extra text.
+
+only respond with the following JSON formats:
+{"audit": "True|False", "additional_context": "...", "document_summary": "...", "section_heading": "...", "reasoning": "..."}
+set audit to true if need to be audited or false to keep current text
+document_summary is the updated summary of the document read so far, at most 3 sentences
+section_heading is the heading of the section the targeted chunk belongs to, keep the current one if the section did not change
+"""
+
+AUDIT_DOCUMENT_PROMPT = """
+You are enriching a text chunk from a RAG document to make it self-contained and understandable on its own by adding additional context.
+The document is read from start to end, you receive the summary of the document so far, the current section heading and the previous chunks.
+Return additional context to support the targeted text chunk. dont mention about targeted chunk or previous chunk on the result.
+
+CRITICAL RULES:
+1. Return at most 2 sentences.
+2. Only add what is strictly necessary so the targeted chunk make sense.
+3. If the targeted chunk already make sense, return audit=False.
+4. Prefer copying exact entity names/titles from the summary or previous chunks when available.
+5. Add section information about the targeted chunk if you found it.
+6. Add entity, date and document section or other context if you found and relevant
+7. Never change original chunk text on audited chunk, only add additional context.
+8. Always return the updated document_summary and section_heading.
+
+{addtional_prompt}
+
+Document summary so far:
+{document_summary}
+
+Current section heading:
+{section_heading}
+
+Previous original chunk text:
+{previous_original_chunk_text}
+
+Targeted audited chunk text:
+{targeted_audited_chunk_text}
+
+Targeted original chunk text:
+{targeted_original_chunk_text}
+"""
+
+@celery_app.task(name="audit_document", bind=True, max_retries=None)
+def audit_document(
+    self,
+    tenant:str,
+    doc_id:str,
+    num_chunks:int,
+    addtional_prompt:str="",
+    look_back:int=AUDIT_LOOK_BACK_WINDOW,
+    start_idx:int=0,
+    document_summary:str="",
+    section_heading:str="",
+    previous_texts:List[str] | None=None,
+    audit_indices:List[int] | None=None,
+    job_id:str | None=None,
+    enqueued_at:float | None=None
+):
+    """
+    This agent will walk every chunk of the document once, carrying a running summary and section heading forward.
+    Each chunk costs one LLM call and sees the last `look_back` chunks.
+    One task audits AUDIT_DOCUMENT_SLICE_SIZE chunks then queues the next slice with the carried context,
+    so audits from other tenants run in between.
+    Every audited chunk stores the summary and heading reached after it. With audit_indices only those
+    chunks are audited, the others are read as previous text and hand over their stored summary and heading,
+    a partial walk starts from the context stored on the chunk before it.
+    """
+    end_idx = min(start_idx + AUDIT_DOCUMENT_SLICE_SIZE, num_chunks)
+    audit_set = None if audit_indices is None else set(audit_indices)
+    slice_indices = [idx for idx in range(start_idx, end_idx) if audit_set is None or idx in audit_set]
+
+    wait = acquire_tenant_tokens(tenant, "audit", len(slice_indices))
+    if wait:
+        raise self.retry(countdown=wait)
+    record_started(tenant, "audit", enqueued_at)
+
+    collection_name = document_collection_name(tenant)
+    system_prompt = prompt_template(AUDIT_DOCUMENT_SYSTEM_PROMPT, {})
+
+    previous_texts = deque(previous_texts or [], maxlen=max(look_back, 0))
+    enriched_payloads = []
+    reviewed_payloads = []
+    # first slice of a walk that doesn't start at the beginning of the document
+    seed_idx = start_idx - 1 if start_idx > 0 and not (document_summary or section_heading) else None
+
+    try:
+        chunk_indices = range(start_idx, end_idx) if seed_idx is None else range(seed_idx, end_idx)
+        chunks = get_points_sync(
+            chunk_ids=[f"{tenant}:{doc_id}:{chunk_idx}" for chunk_idx in chunk_indices],
+            collection_name=collection_name
+        )
+        if seed_idx is not None:
+            seed_payload = chunks.pop(f"{tenant}:{doc_id}:{seed_idx}", {})
+            document_summary = seed_payload.get("document_summary", "")
+            section_heading = seed_payload.get("section_heading", "")
+        document_summary, section_heading = audit_document_slice(
+            tenant, doc_id, range(start_idx, end_idx), chunks, system_prompt, addtional_prompt,
+            document_summary, section_heading, previous_texts, enriched_payloads, audit_set, reviewed_payloads
+        )
+        update_points_sync(collection_name=collection_name, payloads=enriched_payloads)
+        set_payloads_sync(collection_name=collection_name, payloads=reviewed_payloads)
+    finally:
+        record_finished(tenant, "audit", len(slice_indices))
+        record_progress_sync(job_id, "chunks_audited", len(slice_indices))
+        # also queued when this slice failed, the rest of the document is still audited and its pending count settled
+        if end_idx < num_chunks:
+            audit_document.delay(
+                tenant=tenant,
+                doc_id=doc_id,
+                num_chunks=num_chunks,
+                addtional_prompt=addtional_prompt,
+                look_back=look_back,
+                start_idx=end_idx,
+                document_summary=document_summary,
+                section_heading=section_heading,
+                previous_texts=list(previous_texts),
+                audit_indices=audit_indices,
+                job_id=job_id,
+                enqueued_at=time.time()
+            )
+
+    if end_idx < num_chunks:
+        return {"audit": "continue", "next_idx": end_idx}
+
+    return {"audit": "finish"}
+
+def audit_document_slice(tenant, doc_id, chunk_indices, chunks, system_prompt, addtional_prompt, document_summary, section_heading, previous_texts, enriched_payloads, audit_indices=None, reviewed_payloads=None):
+    """
+    Audit chunks in order, appends enriched payloads and returns the updated summary and section heading.
+    Chunks the model kept as they are go to reviewed_payloads with their status and context only.
+    """
+    for chunk_idx in chunk_indices:
+        chunk_id = f"{tenant}:{doc_id}:{chunk_idx}"
+
+        if chunk_id not in chunks:
+            logger.error(f"chunk {chunk_id} not found")
+            continue
+        targeted_chunk_payload = chunks.pop(chunk_id)
+
+        targeted_original_chunk_text = targeted_chunk_payload.get("original_text", "")
+        targeted_audited_chunk_text = targeted_chunk_payload.get("audited_text", "")
+
+        if audit_indices is not None and chunk_idx not in audit_indices:
+            previous_texts.append(targeted_original_chunk_text)
+            document_summary = targeted_chunk_payload.get("document_summary") or document_summary
+            section_heading = targeted_chunk_payload.get("section_heading") or section_heading
+            continue
+        logger.info(f"auditing {chunk_id}")
+
+        agent_prompt = prompt_template(AUDIT_DOCUMENT_PROMPT, {
+            "document_summary": document_summary,
+            "section_heading": section_heading,
+            "previous_original_chunk_text": "\n\n".join(previous_texts),
+            "targeted_audited_chunk_text": targeted_audited_chunk_text,
+            "targeted_original_chunk_text": targeted_original_chunk_text,
+            "addtional_prompt": addtional_prompt
+        })
+
+        message = [{
+            "role": "system",
+            "content": system_prompt
+        }, {
+            "role": "user",
+            "content": agent_prompt
+        }]
+
+        previous_texts.append(targeted_original_chunk_text)
+
+        try:
+            action = agent_action(message)
+        except Exception as e:
+            logger.error(f"found error while auditing {chunk_id} with error detail: {e}")
+            continue
+
+        logger.info("action: %s", action)
+
+        document_summary = action.get("document_summary") or document_summary
+        section_heading = action.get("section_heading") or section_heading
+        context = {"document_summary": document_summary, "section_heading": section_heading}
+
+        if action.get("audit") in ['True', 1, "true", True]:
+            audited_text = "\n\n".join(
+                text for text in [targeted_audited_chunk_text, action.get("additional_context", "")] if text
+            )
+            enriched_payloads.append({**audited_payload(targeted_chunk_payload, audited_text), **context})
+            logger.info("Audited text updated")
+        else:
+            if reviewed_payloads is not None:
+                reviewed_payloads.append({"chunk_id": chunk_id, "audit_status": "audited", **context})
+            logger.info("No need to update text")
+
+    return document_summary, section_heading
+
 ############################################## RITRIVAL EVALUATION AGENT ###############################################
 RITRIVAL_EVALUATION_SYSTEM_PROMPT = """
 only return JSON formatted response not markdown no extra text.
@@ -224,17 +482,18 @@ Ritrived Document:
 """
 
 @celery_app.task(name="evaluate_chunk", bind=True)
-def background_evaluation_agent(self, question:str, documents:List[dict]):
+def background_evaluation_agent(self, question:str | List[dict], documents:List[dict]):
     """
-    This agent will evaluate every ritrived chunks to add more context to original text chunk
+    This agent will evaluate every ritrived chunks to add more context to original text chunk.
+    question is the user question or the chat agent messages, both are rendered to text for the prompt
     """
     logger.info("Starting evaluation of ritrived documents")
 
     system_prompt = prompt_template(RITRIVAL_EVALUATION_SYSTEM_PROMPT, {})
 
     agent_prompt = prompt_template(RITRIVAL_EVALUATION_PROMPT, {
-        "question": question,
-        "ritrived_document": documents
+        "question": question if isinstance(question, str) else json.dumps(question),
+        "ritrived_document": json.dumps(documents)
     })
 
     message = [{
@@ -245,18 +504,25 @@ def background_evaluation_agent(self, question:str, documents:List[dict]):
         "content": agent_prompt
     }]
 
-    response = responses_sync(message=message, model=OLLAMA_INDEXING_AGENT_MODEL)
-
-    action = safe_json_loads(response['message']['content'])
+    action = agent_action(message)
 
     logger.info("action: %s", action)
 
     if action["audit"] in ['True', 1, "true"]:
+        tasks = []
         for chunk_args in action["audit_agent_args"]:
             try:
-                audit_chunk().delay(**chunk_args)
+                tasks.append(audit_chunk_batch.s(
+                    tenant=chunk_args["tenant"],
+                    doc_id=chunk_args["doc_id"],
+                    chunk_indices=[int(chunk_args["chunk_idx"])],
+                    addtional_prompt=action.get("additional_prompt", ""),
+                    enqueued_at=time.time()
+                ))
+                record_enqueued(chunk_args["tenant"], "audit", 1)
             except Exception as e:
-                logger.error(f"Error scheduling audit chunk for {chunk_args['chunk_idx']}: {e}")
+                logger.error(f"Error scheduling audit chunk for {chunk_args}: {e}")
+        group(tasks).apply_async()
 
         logger.info("Evaluation chunk audit sent to audit agent")
     else:
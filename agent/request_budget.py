@@ -0,0 +1,43 @@
+import os
+import time
+import dotenv
+
+dotenv.load_dotenv()
+
+CHAT_REQUEST_TIMEOUT = float(os.environ.get("CHAT_REQUEST_TIMEOUT", 60))
+CHAT_FINAL_ANSWER_RESERVE = float(os.environ.get("CHAT_FINAL_ANSWER_RESERVE", 10))
+
+class RequestBudget:
+    """
+    Wall-clock budget of one chat request.
+    The agent loop may use everything but the final answer reserve, which is kept for forcing an answer
+    from the documents already retrieved. Time spent is accumulated per step for the response.
+    """
+    def __init__(self, timeout:float = CHAT_REQUEST_TIMEOUT, final_answer_reserve:float = CHAT_FINAL_ANSWER_RESERVE):
+        self.timeout = timeout
+        self.final_answer_reserve = min(final_answer_reserve, timeout / 2)
+        self.started_at = time.monotonic()
+        self.deadline = self.started_at + timeout
+        self.spent = {}
+        self.deadline_exceeded = False
+
+    def remaining(self, reserve:bool = True) -> float:
+        remaining = self.deadline - time.monotonic()
+        if reserve:
+            remaining -= self.final_answer_reserve
+        return max(remaining, 0.0)
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def record(self, step:str, started_at:float):
+        self.spent[step] = self.spent.get(step, 0.0) + time.monotonic() - started_at
+
+    def report(self) -> dict:
+        return {
+            "budget_seconds": self.timeout,
+            "elapsed_seconds": round(time.monotonic() - self.started_at, 3),
+            "deadline_exceeded": self.deadline_exceeded,
+            "spent_seconds": {step: round(seconds, 3) for step, seconds in self.spent.items()}
+        }
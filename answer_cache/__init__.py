@@ -0,0 +1,3 @@
+from .answer_cache_service import lookup_answer, store_answer, get_answer_cache_stats, ANSWER_CACHE_ENABLED
+
+__all__ = ['lookup_answer', 'store_answer', 'get_answer_cache_stats', 'ANSWER_CACHE_ENABLED']
\ No newline at end of file
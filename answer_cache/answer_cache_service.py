@@ -0,0 +1,134 @@
+from qdrant_client import models
+from embedding import embed_query, get_embedding_dimension
+from vector_db.collection_config import collection_config, TENANT_INDEX_SCHEMA
+from vector_db.vector_db_service import async_qdrant_client, QDRANT_ID_NAMESPACE_UUID, QDRANT_COLLECTION_LAYOUT, QDRANT_SHARED_COLLECTION
+import uuid
+import time
+import logging
+import os
+import dotenv
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+ANSWER_CACHE_ENABLED = os.environ.get("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_SIMILARITY_THRESHOLD = float(os.environ.get("ANSWER_CACHE_SIMILARITY_THRESHOLD", 0.95))
+ANSWER_CACHE_TTL = int(os.environ.get("ANSWER_CACHE_TTL", 24 * 3600))
+
+# entries are filtered by these, tenant is added in the shared layout
+CACHE_INDEX_SCHEMAS = {
+    "generation": models.PayloadSchemaType.INTEGER,
+    "created_at": models.PayloadSchemaType.FLOAT,
+}
+
+stats = {"hits": 0, "misses": 0, "stores": 0, "errors": 0}
+
+# cache collections known to exist in this process, so lookups don't ask Qdrant every time
+cache_collections = set()
+
+def cache_collection_name(tenant:str) -> str:
+    if QDRANT_COLLECTION_LAYOUT == "shared":
+        return f"{QDRANT_SHARED_COLLECTION}_answer_cache"
+    return f"tenants_{tenant}_answer_cache"
+
+def cache_filter(tenant:str, conditions:list) -> models.Filter:
+    if QDRANT_COLLECTION_LAYOUT == "shared":
+        conditions = [models.FieldCondition(key="tenant", match=models.MatchValue(value=tenant)), *conditions]
+    return models.Filter(must=conditions)
+
+async def ensure_cache_collection(collection_name:str):
+    """
+    Dense-only collection with the payload indexes the cache filters on, created on first use
+    """
+    if collection_name in cache_collections:
+        return
+    if not await async_qdrant_client.collection_exists(collection_name=collection_name):
+        shared = QDRANT_COLLECTION_LAYOUT == "shared"
+        await async_qdrant_client.create_collection(
+            collection_name=collection_name,
+            **collection_config(await get_embedding_dimension(), shared=shared, hybrid=False)
+        )
+        index_schemas = {"tenant": TENANT_INDEX_SCHEMA, **CACHE_INDEX_SCHEMAS} if shared else CACHE_INDEX_SCHEMAS
+        for field_name, field_schema in index_schemas.items():
+            await async_qdrant_client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema)
+    cache_collections.add(collection_name)
+
+def normalize_question(question:str) -> str:
+    return " ".join(question.lower().split())
+
+async def lookup_answer(tenant:str, question:str, generation:int) -> dict | None:
+    """
+    Closest cached answer of the tenant above the similarity threshold, only entries stored
+    at the current document generation and inside the TTL count
+    """
+    try:
+        collection_name = cache_collection_name(tenant)
+        await ensure_cache_collection(collection_name)
+
+        search_result = await async_qdrant_client.query_points(
+            collection_name=collection_name,
+            query=await embed_query(normalize_question(question)),
+            query_filter=cache_filter(tenant, [
+                models.FieldCondition(key="generation", match=models.MatchValue(value=generation)),
+                models.FieldCondition(key="created_at", range=models.Range(gte=time.time() - ANSWER_CACHE_TTL))
+            ]),
+            score_threshold=ANSWER_CACHE_SIMILARITY_THRESHOLD,
+            with_payload=True,
+            limit=1
+        )
+    except Exception as e:
+        stats["errors"] += 1
+        logger.error(f"Error during answer cache lookup: {e}")
+        return None
+
+    if not search_result.points:
+        stats["misses"] += 1
+        return None
+
+    stats["hits"] += 1
+    point = search_result.points[0]
+    logger.info(f"answer cache hit for tenant {tenant} with score {point.score:.3f}")
+    return {**point.payload, "score": point.score}
+
+async def store_answer(tenant:str, question:str, generation:int, answer:str, documents:list):
+    """
+    Cache an answer computed at the given document generation, entries of older generations are dropped
+    """
+    try:
+        collection_name = cache_collection_name(tenant)
+        normalized = normalize_question(question)
+        await ensure_cache_collection(collection_name)
+
+        await async_qdrant_client.upsert(
+            collection_name=collection_name,
+            points=[models.PointStruct(
+                id=uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, f"{tenant}:{generation}:{normalized}"),
+                vector=await embed_query(normalized),
+                payload={
+                    "tenant": tenant,
+                    "question": question,
+                    "answer": answer,
+                    "documents": documents,
+                    "generation": generation,
+                    "created_at": time.time()
+                }
+            )]
+        )
+        await async_qdrant_client.delete(
+            collection_name=collection_name,
+            points_selector=models.FilterSelector(filter=cache_filter(tenant, [
+                models.FieldCondition(key="generation", range=models.Range(lt=generation))
+            ]))
+        )
+        stats["stores"] += 1
+    except Exception as e:
+        stats["errors"] += 1
+        logger.error(f"Error during answer cache store: {e}")
+
+def get_answer_cache_stats() -> dict:
+    lookups = stats["hits"] + stats["misses"]
+    return {
+        **stats,
+        "hit_rate": stats["hits"] / lookups if lookups else 0.0
+    }
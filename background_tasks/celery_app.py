@@ -7,4 +7,18 @@ celery_app = Celery(
     backend=os.environ.get("CELERY_RESULT_BACKEND"),
 )
 
-celery_app.conf.update(include=["agent.indexing_agent"])
\ No newline at end of file
+celery_app.conf.update(
+    include=["agent.indexing_agent", "documents.documents_service"],
+    task_default_queue="default",
+    # audits are bulk work, evaluations follow chat requests and get their own workers
+    task_routes={
+        "audit_chunk": {"queue": "audit"},
+        "audit_chunk_batch": {"queue": "audit"},
+        "audit_document": {"queue": "audit"},
+        "evaluate_chunk": {"queue": "evaluation"},
+        # extraction and embedding run on their own worker so big uploads don't hold audit slots
+        "ingest_document": {"queue": "ingest"},
+    },
+    # take one message at a time so re-queued slices of other tenants are picked up in between
+    worker_prefetch_multiplier=1,
+)
\ No newline at end of file
@@ -0,0 +1,110 @@
+import redis
+import time
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+TENANT_BUCKET_CAPACITY = float(os.environ.get("TENANT_BUCKET_CAPACITY", 20))
+TENANT_BUCKET_REFILL_RATE = float(os.environ.get("TENANT_BUCKET_REFILL_RATE", 1))
+# seconds the queue stats of a tenant are kept after their last update
+TENANT_QUEUE_STATS_TTL = int(os.environ.get("TENANT_QUEUE_STATS_TTL", 7 * 24 * 3600))
+
+redis_client = redis.Redis.from_url(os.environ["CELERY_BROKER_URL"])
+
+# returns 0 when the tokens are taken, otherwise the seconds until enough tokens are available.
+# An empty bucket only throttles while another tenant has pending work (KEYS[2] holds pending chunks
+# by tenant), a tenant alone on the queue runs at full speed and its bucket stays at 0.
+TOKEN_BUCKET_SCRIPT = redis_client.register_script("""
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local now = tonumber(ARGV[3])
+local requested = math.min(tonumber(ARGV[4]), capacity)
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or capacity
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(capacity, tokens + math.max(now - ts, 0) * rate)
+
+local waiting_tenants = redis.call('ZCOUNT', KEYS[2], '(0', '+inf')
+local own_pending = tonumber(redis.call('ZSCORE', KEYS[2], ARGV[5]) or 0)
+if own_pending > 0 then
+    waiting_tenants = waiting_tenants - 1
+end
+
+local wait = 0
+if tokens >= requested then
+    tokens = tokens - requested
+elseif waiting_tenants == 0 then
+    tokens = 0
+else
+    wait = (requested - tokens) / rate
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 60)
+return tostring(wait)
+""")
+
+def pending_key(queue:str) -> str:
+    return f"tenant_pending:{queue}"
+
+def stats_key(tenant:str, queue:str) -> str:
+    return f"tenant_queue:{queue}:{tenant}"
+
+def acquire_tenant_tokens(tenant:str, queue:str, tokens:int = 1) -> float:
+    """
+    Take tokens from the tenant bucket of a queue, returns how long to wait when the bucket is empty
+    and other tenants have pending work. Tasks that have to wait are retried with that countdown
+    so other tenants' tasks run first.
+    """
+    wait = float(TOKEN_BUCKET_SCRIPT(
+        keys=[f"tenant_bucket:{queue}:{tenant}", pending_key(queue)],
+        args=[TENANT_BUCKET_CAPACITY, TENANT_BUCKET_REFILL_RATE, time.time(), tokens, tenant]
+    ))
+    if wait:
+        pipe = redis_client.pipeline()
+        pipe.hincrby(stats_key(tenant, queue), "throttled", 1)
+        pipe.expire(stats_key(tenant, queue), TENANT_QUEUE_STATS_TTL)
+        pipe.execute()
+    return wait
+
+def record_enqueued(tenant:str, queue:str, count:int):
+    key = stats_key(tenant, queue)
+    pipe = redis_client.pipeline()
+    pipe.hincrby(key, "pending", count)
+    pipe.hincrby(key, "enqueued", count)
+    pipe.expire(key, TENANT_QUEUE_STATS_TTL)
+    pipe.zincrby(pending_key(queue), count, tenant)
+    pipe.execute()
+
+def record_started(tenant:str, queue:str, enqueued_at:float | None):
+    if enqueued_at is None:
+        return
+    latency = time.time() - enqueued_at
+    pipe = redis_client.pipeline()
+    pipe.hset(stats_key(tenant, queue), "last_queue_latency", round(latency, 3))
+    pipe.expire(stats_key(tenant, queue), TENANT_QUEUE_STATS_TTL)
+    pipe.execute()
+    logger.info(f"{queue} task for tenant {tenant} waited {latency:.2f}s in queue")
+
+def record_finished(tenant:str, queue:str, count:int):
+    pipe = redis_client.pipeline()
+    pipe.hincrby(stats_key(tenant, queue), "pending", -count)
+    pipe.expire(stats_key(tenant, queue), TENANT_QUEUE_STATS_TTL)
+    pipe.zincrby(pending_key(queue), -count, tenant)
+    pipe.zremrangebyscore(pending_key(queue), "-inf", 0)
+    pipe.execute()
+
+def get_tenant_queue_stats(tenant:str, queue:str = "audit") -> dict:
+    """
+    pending/enqueued are counted in chunks, last_queue_latency in seconds
+    """
+    stats = redis_client.hgetall(stats_key(tenant, queue))
+    return {key.decode(): float(value) for key, value in stats.items()}
+
+def get_pending_by_tenant(queue:str = "audit") -> dict[str, float]:
+    """
+    Pending chunks of every tenant with work on the queue
+    """
+    return {tenant.decode(): score for tenant, score in redis_client.zrange(pending_key(queue), 0, -1, withscores=True)}
@@ -0,0 +1,67 @@
+import redis
+import redis.asyncio as async_redis
+import time
+import os
+
+INGEST_JOB_TTL = int(os.environ.get("INGEST_JOB_TTL", 7 * 24 * 3600))
+
+redis_client = redis.Redis.from_url(os.environ["CELERY_BROKER_URL"])
+async_redis_client = async_redis.Redis.from_url(os.environ["CELERY_BROKER_URL"])
+
+# stage counters of an ingestion job, incremented by the ingest worker and the audit tasks
+COUNTERS = ["pages_total", "pages_parsed", "chunks_indexed", "chunks_embedded", "chunks_to_audit", "chunks_audited"]
+
+def job_key(job_id:str) -> str:
+    return f"ingest_job:{job_id}"
+
+async def create_job(job_id:str, tenant:str, document_id:str, filename:str):
+    now = time.time()
+    async with async_redis_client.pipeline(transaction=True) as pipe:
+        pipe.hset(job_key(job_id), mapping={
+            "status": "queued",
+            "tenant": tenant,
+            "document_id": document_id,
+            "filename": filename,
+            "created_at": now,
+            "updated_at": now,
+            **{counter: 0 for counter in COUNTERS}
+        })
+        pipe.expire(job_key(job_id), INGEST_JOB_TTL)
+        await pipe.execute()
+
+async def update_job(job_id:str | None, **fields):
+    if job_id is None:
+        return
+    await async_redis_client.hset(job_key(job_id), mapping={**fields, "updated_at": time.time()})
+
+async def record_progress(job_id:str | None, counter:str, count:int):
+    if job_id is None:
+        return
+    async with async_redis_client.pipeline(transaction=True) as pipe:
+        pipe.hincrby(job_key(job_id), counter, count)
+        pipe.hset(job_key(job_id), "updated_at", time.time())
+        await pipe.execute()
+
+def record_progress_sync(job_id:str | None, counter:str, count:int):
+    if job_id is None:
+        return
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.hincrby(job_key(job_id), counter, count)
+    pipe.hset(job_key(job_id), "updated_at", time.time())
+    pipe.execute()
+
+async def get_job(job_id:str) -> dict | None:
+    """
+    Job state with its counters, an auditing job is done once every chunk sent to the audit was processed
+    """
+    raw = await async_redis_client.hgetall(job_key(job_id))
+    if not raw:
+        return None
+    job = {key.decode(): value.decode() for key, value in raw.items()}
+    for counter in COUNTERS:
+        job[counter] = int(job.get(counter, 0))
+    for field in ("created_at", "updated_at"):
+        job[field] = float(job[field])
+    if job["status"] == "auditing" and job["chunks_audited"] >= job["chunks_to_audit"]:
+        job["status"] = "done"
+    return {"job_id": job_id, **job}
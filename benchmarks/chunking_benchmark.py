@@ -0,0 +1,72 @@
+"""
+Micro benchmark for chunking throughput on multi megabyte texts.
+
+    python -m benchmarks.chunking_benchmark --size-mb 4
+"""
+import argparse
+import random
+import time
+from chunking import chunk_text
+
+WORDS = "the project report section revenue growth customer contract delivery system model data value".split()
+
+def legacy_chunk_text(text:str, chunk_size:int = 800, overlap_size:int = 1600) -> list:
+    """
+    Previous character by character implementation, kept here as the baseline
+    """
+    chunks = []
+    current_chunk = ""
+    for char in text:
+        if len(current_chunk) < overlap_size:
+            if len(current_chunk) >= chunk_size and (char == "." or char == "\n"):
+                chunks.append(current_chunk)
+                current_chunk = ""
+            else:
+                current_chunk += char
+        else:
+            chunks.append(current_chunk)
+            current_chunk = ""
+
+    if current_chunk:
+        chunks.append(current_chunk)
+
+    return chunks
+
+def generate_text(size_mb:float, seed:int = 0) -> str:
+    rng = random.Random(seed)
+    target = int(size_mb * 1024 * 1024)
+    sentences = []
+    length = 0
+    while length < target:
+        sentence = " ".join(rng.choices(WORDS, k=rng.randint(4, 40))) + rng.choice([". ", ".\n", "\n"])
+        sentences.append(sentence)
+        length += len(sentence)
+    return "".join(sentences)
+
+def run(name:str, func, text:str, repeat:int):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunks = func(text)
+        best = min(best, time.perf_counter() - start)
+    size_mb = len(text) / 1024 / 1024
+    print(f"{name:<10} {len(chunks):>8} chunks {best:>8.3f}s {len(chunks) / best:>12.0f} chunks/s {size_mb / best:>8.1f} MB/s")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--size-mb", type=float, default=4)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--skip-legacy", action="store_true")
+    args = parser.parse_args()
+
+    text = generate_text(args.size_mb)
+    print(f"text size {len(text) / 1024 / 1024:.1f} MB")
+
+    if not args.skip_legacy:
+        run("legacy", legacy_chunk_text, text, args.repeat)
+    run("character", lambda t: chunk_text(t, strategy="character"), text, args.repeat)
+    run("sliding", lambda t: chunk_text(t, strategy="sliding"), text, args.repeat)
+    run("token", lambda t: chunk_text(t, chunk_size=200, max_chunk_size=400, strategy="token"), text, args.repeat)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
 from .chat_controller import chat_router
-from .chat_service import chat_completion
+from .chat_service import chat_completion, chat_completion_stream
 
-__all__ = ["chat_router", "chat_completion"]
\ No newline at end of file
+__all__ = ["chat_router", "chat_completion", "chat_completion_stream"]
\ No newline at end of file
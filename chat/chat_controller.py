@@ -1,5 +1,6 @@
 from fastapi import APIRouter, HTTPException
-from .chat_service import chat_completion as chat_completion_service
+from fastapi.responses import StreamingResponse
+from .chat_service import chat_completion as chat_completion_service, chat_completion_stream as chat_completion_stream_service
 from .chat_dto import ChatRequest, ChatResponse
 import logging
 
@@ -16,9 +17,22 @@ chat_router = APIRouter(prefix="/chat", tags=["chat"])
 async def chat_completion(payload: ChatRequest):
     logger.info(f"POST /api/v1/chat Request payload:{dict(payload)}")
     try:
-        responses = await chat_completion_service(message=payload.query, tenant=payload.tenant, user_id=payload.user_id)
+        responses = await chat_completion_service(message=payload.query, tenant=payload.tenant, user_id=payload.user_id, fast_mode=payload.fast_mode, timeout=payload.timeout_seconds)
         logger.info(f"POST /api/v1/chat Response payload:{dict(responses)}")
         return responses
     except Exception as e:
         logger.error(f"POST /api/v1/chat ERROR while processing {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=f"Internal Server Error: {e}")
+
+@chat_router.post(
+        "/stream",
+        summary="Chat Completition Stream",
+        description="Sending question to RAG Service, agent progress and answer tokens are streamed as Server-Sent Events"
+)
+async def chat_completion_stream(payload: ChatRequest):
+    logger.info(f"POST /api/v1/chat/stream Request payload:{dict(payload)}")
+    return StreamingResponse(
+        chat_completion_stream_service(message=payload.query, tenant=payload.tenant, user_id=payload.user_id, fast_mode=payload.fast_mode, timeout=payload.timeout_seconds),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
\ No newline at end of file
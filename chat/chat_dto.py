@@ -5,6 +5,8 @@ class ChatRequest(BaseModel):
     query: str = Field(..., examples=["Halo are you there?"])
     tenant: str = Field(..., examples=["tenant_0"])
     user_id: str = Field(..., examples=["user_0"])
+    fast_mode: bool | None = Field(None, description="answer confident retrievals with one grounded call, defaults to CHAT_FAST_MODE")
+    timeout_seconds: float | None = Field(None, gt=0, description="latency budget of the request, defaults to CHAT_REQUEST_TIMEOUT")
 
 class ChatResponse(BaseModel):
     question: str = Field(..., example="Halo are you there?")
@@ -12,5 +14,10 @@ class ChatResponse(BaseModel):
     ritrieved_documents: list = Field(...)
     prompt_used: list = Field(...)
     token_usage_estimation: int = Field(...)
+    prompt_tokens: int = Field(0)
+    completion_tokens: int = Field(0)
+    answer_mode: str = Field("agent", examples=["fast", "agent", "forced", "cache"])
+    time_budget: dict = Field(default_factory=dict)
+    cache_hit: bool = Field(False)
 
 
@@ -1,7 +1,11 @@
-from agent import chat_agent
-from chat_history import add_chat_history
+from agent import chat_agent, chat_agent_stream
+from chat_history import add_chat_histories
+from answer_cache import lookup_answer, store_answer, ANSWER_CACHE_ENABLED
+from vector_db import get_document_generation
 from fastapi import HTTPException
 import logging
+import json
+from typing import AsyncIterator
 import os
 import dotenv
 
@@ -11,33 +15,116 @@ OLLAMA_CHAT_MODEL = os.environ.get('OLLAMA_CHAT_MODEL')
 
 logger = logging.getLogger(__name__)
 
-async def chat_completion(message:str, tenant:str, user_id:str, model:str = OLLAMA_CHAT_MODEL, max_tokens:int = 1024, temperature:float = 0.2) -> dict:    
+async def save_chat_turn(tenant:str, user_id:str, message:str, answer:str):
+    try:
+        await add_chat_histories(tenant, user_id, [{
+            "role": "user",
+            "content": message
+        }, {
+            "role": "assistant",
+            "content": answer
+        }])
+    except Exception as e:
+        logger.error(f"Error Found with detail: {e}")
+
+async def lookup_cached_response(message:str, tenant:str) -> tuple[dict | None, int | None]:
+    """
+    Response of a near-duplicate question answered against the current documents,
+    along with the document generation a new answer should be cached at
+    """
+    if not ANSWER_CACHE_ENABLED:
+        return None, None
+    generation = await get_document_generation(tenant)
+    if generation is None:
+        return None, None
+
+    cached = await lookup_answer(tenant, message, generation)
+    if cached is None:
+        return None, generation
+
+    return {
+        "question": message,
+        "answer": cached['answer'],
+        "ritrieved_documents": cached['documents'],
+        "prompt_used": [],
+        "token_usage_estimation": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "answer_mode": "cache",
+        "time_budget": {},
+        "cache_hit": True
+    }, generation
+
+async def cache_agent_response(message:str, tenant:str, generation:int | None, agent_responses:dict):
+    """
+    Forced answers and answers that depend on the user's chat history are not shared through the cache
+    """
+    if generation is None or agent_responses['answer_mode'] == "forced" or not agent_responses['final_answer']:
+        return
+    if any(prompt.get("tool_name") == "get_chat_history" for prompt in agent_responses['final_prompt']):
+        return
+    await store_answer(tenant, message, generation, agent_responses['final_answer'], agent_responses['final_documents'])
+
+def build_chat_response(message:str, agent_responses:dict) -> dict:
+    return {
+        "question": message,
+        "answer": agent_responses['final_answer'],
+        "ritrieved_documents": agent_responses['final_documents'],
+        "prompt_used": agent_responses['final_prompt'],
+        "token_usage_estimation": agent_responses['token_usage_estimation'],
+        "prompt_tokens": agent_responses['prompt_tokens'],
+        "completion_tokens": agent_responses['completion_tokens'],
+        "answer_mode": agent_responses['answer_mode'],
+        "time_budget": agent_responses['time_budget'],
+        "cache_hit": False
+    }
+
+async def chat_completion(message:str, tenant:str, user_id:str, model:str = OLLAMA_CHAT_MODEL, max_tokens:int = 1024, temperature:float = 0.2, fast_mode:bool | None = None, timeout:float | None = None) -> dict:    
     try: 
-        agent_responses = await chat_agent(message=message, tenant=tenant, user_id=user_id, model=model)
-
-        try:
-            await add_chat_history(tenant, user_id, {
-                "role": "user",
-                "content": message
-            })
-            
-            await add_chat_history(tenant, user_id, {
-                "role": "assistant",
-                "content": agent_responses['final_answer']
-            })
-        except Exception as e:
-            logger.error(f"Error Found with detail: {e}")
-
-        result = {
-            "question": message,
-            "answer": agent_responses['final_answer'],
-            "ritrieved_documents": agent_responses['final_documents'],
-            "prompt_used": agent_responses['final_prompt'],
-            "token_usage_estimation": agent_responses['token_usage_estimation']
-        }
-        return result
+        cached_response, generation = await lookup_cached_response(message, tenant)
+        if cached_response is not None:
+            await save_chat_turn(tenant, user_id, message, cached_response['answer'])
+            return cached_response
+
+        agent_responses = await chat_agent(message=message, tenant=tenant, user_id=user_id, model=model, fast_mode=fast_mode, timeout=timeout)
+
+        await save_chat_turn(tenant, user_id, message, agent_responses['final_answer'])
+        await cache_agent_response(message, tenant, generation, agent_responses)
+
+        return build_chat_response(message, agent_responses)
     except Exception as e:
         logger.error(str(e))
         raise HTTPException(500)
 
+def sse_event(event_type:str, data:dict) -> str:
+    return f"event: {event_type}\ndata: {json.dumps(data)}\n\n"
+
+async def chat_completion_stream(message:str, tenant:str, user_id:str, model:str = OLLAMA_CHAT_MODEL, fast_mode:bool | None = None, timeout:float | None = None) -> AsyncIterator[str]:
+    """
+    Server-Sent Events for agent progress and final answer tokens, the last "done" event carries the full ChatResponse
+    """
+    try:
+        cached_response, generation = await lookup_cached_response(message, tenant)
+        if cached_response is not None:
+            await save_chat_turn(tenant, user_id, message, cached_response['answer'])
+            chunk_ids = [document['chunk_id'] for document in cached_response['ritrieved_documents']]
+            yield sse_event("documents", {"type": "documents", "chunk_ids": chunk_ids})
+            yield sse_event("token", {"type": "token", "content": cached_response['answer'], "attempt": 1})
+            yield sse_event("done", cached_response)
+            return
+
+        async for event in chat_agent_stream(message=message, tenant=tenant, user_id=user_id, model=model, fast_mode=fast_mode, timeout=timeout):
+            if event["type"] != "final":
+                yield sse_event(event['type'], event)
+                continue
+
+            await save_chat_turn(tenant, user_id, message, event['final_answer'])
+
+            yield sse_event("done", build_chat_response(message, event))
+
+            await cache_agent_response(message, tenant, generation, event)
+    except Exception as e:
+        logger.error(str(e))
+        yield sse_event("error", {"detail": str(e)})
+
 
@@ -1,3 +1,3 @@
-from .chat_history_service import get_chat_history, add_chat_history
+from .chat_history_service import get_chat_history, add_chat_history, add_chat_histories, get_chat_history_stats
 
-__all__ = ['get_chat_history', 'add_chat_history']
\ No newline at end of file
+__all__ = ['get_chat_history', 'add_chat_history', 'add_chat_histories', 'get_chat_history_stats']
\ No newline at end of file
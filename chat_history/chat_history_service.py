@@ -1,35 +1,90 @@
-import redis
+import redis.asyncio as redis
 import dotenv
 import os
 import json
+import time
 import logging
+from redis_store import REDIS_HOST, REDIS_PORT, REDIS_PASSWORD
 
 logger = logging.getLogger(__name__)
 
 dotenv.load_dotenv()
 
-REDIS_HOST = os.environ.get('REDIS_HOST')
-REDIS_PORT = os.environ.get('REDIS_PORT')
-REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', 50))
+REDIS_POOL_TIMEOUT = int(os.environ.get('REDIS_POOL_TIMEOUT', 5))
 
-redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD)
+CHAT_HISTORY_MAX_MESSAGES = 20
+CHAT_HISTORY_TTL = 24 * 3600
 
-async def add_chat_history(tenant:str, user_id:str, value:dict):
+# one pool for the whole API process, callers wait up to REDIS_POOL_TIMEOUT for a free connection
+redis_pool = redis.BlockingConnectionPool(
+    host=REDIS_HOST,
+    port=REDIS_PORT,
+    password=REDIS_PASSWORD,
+    max_connections=REDIS_MAX_CONNECTIONS,
+    timeout=REDIS_POOL_TIMEOUT
+)
+redis_client = redis.Redis(connection_pool=redis_pool)
+
+latency_stats = {}
+# operations holding a pool connection, counted here since the pool doesn't expose its checkouts
+pool_stats = {"in_use_connections": 0, "max_in_use_connections": 0}
+
+def start_operation() -> float:
+    pool_stats["in_use_connections"] += 1
+    pool_stats["max_in_use_connections"] = max(pool_stats["max_in_use_connections"], pool_stats["in_use_connections"])
+    return time.perf_counter()
+
+def record_latency(operation:str, started_at:float):
+    pool_stats["in_use_connections"] -= 1
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    stats = latency_stats.setdefault(operation, {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+    stats["count"] += 1
+    stats["total_ms"] += elapsed_ms
+    stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+
+async def add_chat_histories(tenant:str, user_id:str, values:list[dict]):
+    """
+    Append several messages, trim and refresh the TTL in a single MULTI round-trip
+    """
+    started_at = start_operation()
     try:
         key = f"chat_history:{tenant}:{user_id}"
-        value = json.dumps(value)
-        redis_client.rpush(key, value)
-        redis_client.ltrim(key, -20, -1)
-        redis_client.expire(key, 24 * 3600)
+        values = [json.dumps(value) for value in values]
+        async with redis_client.pipeline(transaction=True) as pipe:
+            pipe.rpush(key, *values)
+            pipe.ltrim(key, -CHAT_HISTORY_MAX_MESSAGES, -1)
+            pipe.expire(key, CHAT_HISTORY_TTL)
+            await pipe.execute()
 
-        logger.info(f"Add new chat history with key: ${key}, value: ${value}")
+        logger.info(f"Add new chat history with key: ${key}, value: ${values}")
     except Exception as e:
         raise Exception(f"failed to add new chat history with error: {e}")
+    finally:
+        record_latency("add_chat_history", started_at)
+
+async def add_chat_history(tenant:str, user_id:str, value:dict):
+    await add_chat_histories(tenant, user_id, [value])
 
 async def get_chat_history(tenant:str, user_id:str, limit):
     key = f"chat_history:{tenant}:{user_id}"
+    started_at = start_operation()
     try:
-        history_raw = redis_client.lrange(key, -limit, -1)
+        history_raw = await redis_client.lrange(key, -int(limit), -1)
         return [json.loads(buble) for buble in history_raw]
-    except:
-        raise Exception(f"failed to geyt chat history with error: {e}")
\ No newline at end of file
+    except Exception as e:
+        raise Exception(f"failed to geyt chat history with error: {e}")
+    finally:
+        record_latency("get_chat_history", started_at)
+
+def get_chat_history_stats() -> dict:
+    return {
+        "pool": {
+            "max_connections": REDIS_MAX_CONNECTIONS,
+            **pool_stats,
+        },
+        "latency": {
+            operation: {**stats, "avg_ms": stats["total_ms"] / stats["count"]}
+            for operation, stats in latency_stats.items()
+        }
+    }
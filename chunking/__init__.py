@@ -0,0 +1,4 @@
+from .chunking_service import chunk_text, chunk_spans, count_tokens, CHUNK_STRATEGY
+from .semantic_chunking_service import semantic_chunk_text
+
+__all__ = ['chunk_text', 'chunk_spans', 'count_tokens', 'semantic_chunk_text', 'CHUNK_STRATEGY']
\ No newline at end of file
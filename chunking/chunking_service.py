@@ -0,0 +1,136 @@
+import re
+import os
+import logging
+import dotenv
+from functools import lru_cache
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+CHUNK_STRATEGY = os.environ.get("CHUNK_STRATEGY", "character")
+# sizes are tokens for the "token" strategy and characters otherwise
+CHUNK_SIZE = int(os.environ.get("CHUNK_SIZE", 200 if CHUNK_STRATEGY == "token" else 800))
+CHUNK_MAX_SIZE = int(os.environ.get("CHUNK_MAX_SIZE", 400 if CHUNK_STRATEGY == "token" else 1600))
+CHUNK_OVERLAP_SIZE = int(os.environ.get("CHUNK_OVERLAP_SIZE", 200))
+CHUNK_TOKENIZER = os.environ.get("CHUNK_TOKENIZER", "")
+
+CHUNK_STRATEGIES = ("character", "token", "sliding")
+
+BOUNDARY_PATTERN = re.compile(r"[.\n]")
+APPROX_TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+@lru_cache(maxsize=1)
+def load_tokenizer():
+    """
+    Load the embedding model tokenizer named by CHUNK_TOKENIZER (huggingface id or tokenizer.json path).
+    Returns None when not configured or `tokenizers` is not installed, token counts are then approximated.
+    """
+    if not CHUNK_TOKENIZER:
+        return None
+    try:
+        from tokenizers import Tokenizer
+    except ImportError:
+        logger.warning("tokenizers is not installed, falling back to approximate token count")
+        return None
+
+    if os.path.exists(CHUNK_TOKENIZER):
+        return Tokenizer.from_file(CHUNK_TOKENIZER)
+    return Tokenizer.from_pretrained(CHUNK_TOKENIZER)
+
+def count_tokens(texts:list[str]) -> list[int]:
+    tokenizer = load_tokenizer()
+    if tokenizer is None:
+        return [len(APPROX_TOKEN_PATTERN.findall(text)) for text in texts]
+    return [len(encoding.ids) for encoding in tokenizer.encode_batch(texts, add_special_tokens=False)]
+
+def split_segments(text:str) -> list[tuple[int, int]]:
+    """
+    Offsets of sentence/newline segments, each segment ends right after a "." or "\\n"
+    """
+    segments = []
+    start = 0
+    for match in BOUNDARY_PATTERN.finditer(text):
+        segments.append((start, match.end()))
+        start = match.end()
+    if start < len(text):
+        segments.append((start, len(text)))
+    return segments
+
+def measure_segments(text:str, segments:list[tuple[int, int]], strategy:str) -> list[int]:
+    if strategy == "token":
+        return count_tokens([text[start:end] for start, end in segments])
+    return [end - start for start, end in segments]
+
+def split_oversized(segments:list[tuple[int, int]], sizes:list[int], max_size:int) -> tuple[list[tuple[int, int]], list[int]]:
+    """
+    Slice segments bigger than max_size into equal character pieces so every segment fits in one chunk
+    """
+    result_segments = []
+    result_sizes = []
+    for (start, end), size in zip(segments, sizes):
+        if size <= max_size:
+            result_segments.append((start, end))
+            result_sizes.append(size)
+            continue
+
+        pieces = -(-size // max_size)
+        step = -(-(end - start) // pieces)
+        for piece_start in range(start, end, step):
+            piece_end = min(piece_start + step, end)
+            result_segments.append((piece_start, piece_end))
+            result_sizes.append(-(-size * (piece_end - piece_start) // (end - start)))
+    return result_segments, result_sizes
+
+def chunk_spans(text:str, chunk_size:int = CHUNK_SIZE, max_chunk_size:int = CHUNK_MAX_SIZE, overlap_size:int = 0, strategy:str = "character") -> list[tuple[int, int]]:
+    """
+    Pack sentence segments into (start, end) chunk offsets in a single pass.
+    A chunk closes at the first boundary once it reaches chunk_size and never exceeds max_chunk_size.
+    With overlap_size the next chunk starts on the boundary that keeps at most overlap_size of the previous chunk.
+    Sizes are characters, or tokens when strategy is "token".
+    """
+    if strategy == "semantic":
+        raise ValueError("semantic strategy needs sentence embeddings, use semantic_chunk_text")
+    if strategy not in CHUNK_STRATEGIES:
+        raise ValueError(f"Unknown chunk strategy {strategy}, use one of {CHUNK_STRATEGIES}")
+
+    segments = split_segments(text)
+    sizes = measure_segments(text, segments, strategy)
+    segments, sizes = split_oversized(segments, sizes, max_chunk_size)
+
+    spans = []
+    i = 0
+    while i < len(segments):
+        j = i
+        size = 0
+        while j < len(segments) and size < chunk_size and (j == i or size + sizes[j] <= max_chunk_size):
+            size += sizes[j]
+            j += 1
+
+        spans.append((segments[i][0], segments[j - 1][1]))
+        if j == len(segments):
+            break
+
+        next_i = j
+        overlap = 0
+        while overlap_size and next_i - 1 > i and overlap + sizes[next_i - 1] <= overlap_size:
+            overlap += sizes[next_i - 1]
+            next_i -= 1
+        i = next_i
+
+    return spans
+
+def chunk_text(text:str, chunk_size:int = CHUNK_SIZE, max_chunk_size:int = CHUNK_MAX_SIZE, overlap_size:int | None = None, strategy:str = CHUNK_STRATEGY) -> list[str]:
+    """
+    Chunking based on number of characters or tokens with sentence aware boundaries.
+    strategy "sliding" is character chunking with CHUNK_OVERLAP_SIZE characters of overlap.
+    """
+    if overlap_size is None:
+        overlap_size = CHUNK_OVERLAP_SIZE if strategy == "sliding" else 0
+
+    chunks = []
+    for start, end in chunk_spans(text, chunk_size, max_chunk_size, overlap_size, strategy):
+        chunk = text[start:end]
+        if chunk.strip():
+            chunks.append(chunk)
+    return chunks
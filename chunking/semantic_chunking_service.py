@@ -0,0 +1,72 @@
+import os
+import logging
+import dotenv
+import numpy as np
+from embedding import embed_texts
+from .chunking_service import split_segments, split_oversized, CHUNK_MAX_SIZE
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SEMANTIC_CHUNK_MIN_SIZE = int(os.environ.get("SEMANTIC_CHUNK_MIN_SIZE", 400))
+SEMANTIC_CHUNK_BREAKPOINT_PERCENTILE = float(os.environ.get("SEMANTIC_CHUNK_BREAKPOINT_PERCENTILE", 90))
+
+def sentence_distances(embeddings:list[list[float]]) -> np.ndarray:
+    """
+    Cosine distance between every sentence and the next one, computed in one vectorized pass
+    """
+    vectors = np.asarray(embeddings, dtype=np.float32)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    vectors = vectors / np.maximum(norms, 1e-12)
+    return 1.0 - np.einsum("ij,ij->i", vectors[:-1], vectors[1:])
+
+def semantic_spans(sizes:list[int], distances:np.ndarray, min_size:int, max_size:int, percentile:float) -> list[tuple[int, int]]:
+    """
+    Group sentences into (first, last + 1) index ranges, cutting where the distance to the next sentence
+    is above the percentile threshold once the chunk has min_size, or when max_size would be exceeded
+    """
+    if len(sizes) == 0:
+        return []
+
+    breakpoints = np.zeros(len(sizes), dtype=bool)
+    if len(distances):
+        breakpoints[:-1] = distances > np.percentile(distances, percentile)
+
+    spans = []
+    start = 0
+    size = 0
+    for idx, sentence_size in enumerate(sizes):
+        if idx > start and size + sentence_size > max_size:
+            spans.append((start, idx))
+            start = idx
+            size = 0
+        size += sentence_size
+        if breakpoints[idx] and size >= min_size:
+            spans.append((start, idx + 1))
+            start = idx + 1
+            size = 0
+
+    if start < len(sizes):
+        spans.append((start, len(sizes)))
+    return spans
+
+async def semantic_chunk_text(text:str, min_size:int = SEMANTIC_CHUNK_MIN_SIZE, max_size:int = CHUNK_MAX_SIZE, percentile:float = SEMANTIC_CHUNK_BREAKPOINT_PERCENTILE) -> list[str]:
+    """
+    Adaptive chunking, sentences are embedded in batches and chunks are cut where the topic shifts.
+    Sizes are in characters.
+    """
+    segments = [(start, end) for start, end in split_segments(text) if text[start:end].strip()]
+    segments, sizes = split_oversized(segments, [end - start for start, end in segments], max_size)
+    if not segments:
+        return []
+
+    embeddings = await embed_texts([text[start:end] for start, end in segments])
+    distances = sentence_distances(embeddings)
+
+    chunks = []
+    for first, last in semantic_spans(sizes, distances, min_size, max_size, percentile):
+        chunks.append(text[segments[first][0]:segments[last - 1][1]])
+
+    logger.debug(f"Semantic chunking produced {len(chunks)} chunks from {len(segments)} sentences")
+    return chunks
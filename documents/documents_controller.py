@@ -1,7 +1,8 @@
 from fastapi import APIRouter, UploadFile, File, Form, HTTPException
 from .documents_service import upload_file as upload_file_service
+from background_tasks.job_progress import get_job
 
-from .documents_dto import DocumentsRequest, DocumentsResponse
+from .documents_dto import DocumentsRequest, DocumentsResponse, IngestionJobResponse
 
 documents_router = APIRouter(prefix="/documents", tags=["documents"])
 
@@ -9,15 +10,27 @@ documents_router = APIRouter(prefix="/documents", tags=["documents"])
         "/upload",
         response_model=DocumentsResponse,
         summary="Document Upload",
-        description="Upload document"
+        description="Upload document, indexing runs in the background and is followed with the returned job id"
 )
-async def upload_file( 
+async def upload_file(
     tenant: str = Form("tenant_0"),
     document_id: str = Form("document_0"),
     file: UploadFile = File(...)
 ):
     try:
-        result = await upload_file_service(tenant, document_id, file) 
-        return {"result": result}
+        job_id = await upload_file_service(tenant, document_id, file)
+        return {"result": "File Queued For Indexing", "job_id": job_id}
     except Exception as e:
-        return HTTPException(status_code=500, detail=f"Error Found with detai;: {e}")
\ No newline at end of file
+        return HTTPException(status_code=500, detail=f"Error Found with detai;: {e}")
+
+@documents_router.get(
+        "/jobs/{job_id}",
+        response_model=IngestionJobResponse,
+        summary="Ingestion Job Progress",
+        description="Status and per-stage progress of an upload: pages parsed, chunks embedded, chunks audited"
+)
+async def get_ingestion_job(job_id: str):
+    job = await get_job(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"job {job_id} not found")
+    return job
@@ -7,6 +7,23 @@ class DocumentsRequest(BaseModel):
     file: UploadFile = Field(...)
 
 class DocumentsResponse(BaseModel):
-    result: str = Field(..., example= "File Indexing Success")
+    result: str = Field(..., example= "File Queued For Indexing")
+    job_id: str = Field(..., examples=["5f0c3a9e2b7d4e1f8a6b9c0d1e2f3a4b"])
+
+class IngestionJobResponse(BaseModel):
+    job_id: str = Field(..., examples=["5f0c3a9e2b7d4e1f8a6b9c0d1e2f3a4b"])
+    status: str = Field(..., examples=["indexing"], description="queued, indexing, auditing, done or failed")
+    tenant: str = Field(..., examples=["tenant_0"])
+    document_id: str = Field(..., examples=["document_0"])
+    filename: str = Field(..., examples=["report.pdf"])
+    pages_total: int = Field(0)
+    pages_parsed: int = Field(0)
+    chunks_indexed: int = Field(0, description="chunks compared with the stored document")
+    chunks_embedded: int = Field(0, description="new or edited chunks embedded")
+    chunks_to_audit: int = Field(0)
+    chunks_audited: int = Field(0)
+    error: str | None = Field(None)
+    created_at: float = Field(...)
+    updated_at: float = Field(...)
 
 
@@ -1,36 +1,139 @@
-from vector_db.vector_db_service import add_document
+from vector_db.vector_db_service import add_chunks, ensure_collection, document_collection_name, get_document_diff, delete_chunks_from
 from fastapi import UploadFile, File
 import pdfplumber
 from pathlib import Path
 from agent import background_audit_chunks
+from background_tasks import celery_app
+from background_tasks.job_progress import create_job, update_job, record_progress
+from chunking import chunk_text, semantic_chunk_text, CHUNK_STRATEGY
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import AsyncIterator
+import asyncio
+import logging
+import shutil
+import uuid
+import os
+import dotenv
 
-def chunk_text(text:str, chunk_size:int = 800, overlap_size:int = 1600) -> list:
+dotenv.load_dotenv()
+
+PDF_EXTRACT_WORKERS = int(os.environ.get("PDF_EXTRACT_WORKERS", 2))
+PDF_PAGES_PER_TASK = int(os.environ.get("PDF_PAGES_PER_TASK", 8))
+INGEST_BATCH_SIZE = int(os.environ.get("INGEST_BATCH_SIZE", 64))
+INGEST_MAX_PENDING_BATCHES = int(os.environ.get("INGEST_MAX_PENDING_BATCHES", 2))
+
+logger = logging.getLogger(__name__)
+
+pdf_executor = ProcessPoolExecutor(max_workers=PDF_EXTRACT_WORKERS)
+
+def count_pages(file_location:str) -> int:
+    with pdfplumber.open(file_location) as pdf:
+        return len(pdf.pages)
+
+def extract_pages(file_location:str, start:int, end:int) -> list[str]:
+    """
+    Runs inside the process pool, the pdf is reopened per page range so parsed pages don't pile up in memory
+    """
+    with pdfplumber.open(file_location) as pdf:
+        return [pdf.pages[page_idx].extract_text() or "" for page_idx in range(start, end)]
+
+async def iter_pages(file_location:Path, job_id:str | None = None) -> AsyncIterator[str]:
+    """
+    Yield page text in order while later page ranges are extracted in parallel.
+    At most PDF_EXTRACT_WORKERS + 1 ranges are extracted ahead of the consumer.
+    """
+    loop = asyncio.get_running_loop()
+    num_pages = await loop.run_in_executor(pdf_executor, count_pages, str(file_location))
+    await update_job(job_id, pages_total=num_pages)
+
+    pending = deque()
+    for start in range(0, num_pages, PDF_PAGES_PER_TASK):
+        end = min(start + PDF_PAGES_PER_TASK, num_pages)
+        pending.append(loop.run_in_executor(pdf_executor, extract_pages, str(file_location), start, end))
+        if len(pending) > PDF_EXTRACT_WORKERS:
+            pages = await pending.popleft()
+            await record_progress(job_id, "pages_parsed", len(pages))
+            for page in pages:
+                yield page
+
+    while pending:
+        pages = await pending.popleft()
+        await record_progress(job_id, "pages_parsed", len(pages))
+        for page in pages:
+            yield page
+
+async def iter_chunks(pages:AsyncIterator[str]) -> AsyncIterator[str]:
     """
-    Chunking based on number of characters
+    Chunk pages as they arrive, the last chunk of each round is held back until more text arrives
     """
-    chunks = []
-    current_chunk = ""
-    for char in text:
-        if len(current_chunk) < overlap_size:
-            if len(current_chunk) >= chunk_size and (char == "." or char == "\n"):
-                chunks.append(current_chunk)
-                current_chunk = ""
-            else:
-                current_chunk += char
+    remainder = ""
+    async for page in pages:
+        if CHUNK_STRATEGY == "semantic":
+            chunks = await semantic_chunk_text(remainder + page + "\n")
         else:
-            chunks.append(current_chunk)
-            current_chunk = ""
- 
-    if current_chunk:
-        chunks.append(current_chunk)
+            chunks = chunk_text(remainder + page + "\n")
+        for chunk in chunks[:-1]:
+            yield chunk
+        remainder = chunks[-1] if chunks else ""
 
-    return chunks   
+    if remainder:
+        yield remainder
+
+async def index_chunks(tenant:str, document_id:str, title:str, chunks:AsyncIterator[str], job_id:str | None = None) -> tuple[int, list[int]]:
+    """
+    Embed and upsert chunks in batches of INGEST_BATCH_SIZE while extraction keeps running.
+    The bounded queue pauses extraction when embedding falls behind.
+    A re-uploaded document only writes chunks whose content changed and drops the indices past its new end.
+    Returns the number of chunks and the indices that need an audit.
+    """
+    await ensure_collection(document_collection_name(tenant))
+    diff = await get_document_diff(tenant, document_id)
+
+    queue = asyncio.Queue(maxsize=INGEST_MAX_PENDING_BATCHES)
+    num_chunks = 0
+    audit_indices = []
+
+    async def produce():
+        nonlocal num_chunks
+        batch = []
+        async for chunk in chunks:
+            batch.append(chunk)
+            if len(batch) >= INGEST_BATCH_SIZE:
+                await queue.put((num_chunks, batch))
+                num_chunks += len(batch)
+                batch = []
+        if batch:
+            await queue.put((num_chunks, batch))
+            num_chunks += len(batch)
+        await queue.put(None)
+
+    async def consume():
+        while (item := await queue.get()) is not None:
+            start_index, batch = item
+            to_audit, num_embedded = await add_chunks(tenant=tenant, doc_id=document_id, title=title, chunks=batch, start_index=start_index, diff=diff)
+            audit_indices.extend(to_audit)
+            await record_progress(job_id, "chunks_indexed", len(batch))
+            await record_progress(job_id, "chunks_embedded", num_embedded)
+            logger.info(f"Indexed chunks {start_index}-{start_index + len(batch) - 1} of {tenant}:{document_id}, {num_embedded} embedded")
+
+    async with asyncio.TaskGroup() as task_group:
+        task_group.create_task(produce())
+        task_group.create_task(consume())
+
+    if diff.num_stored > num_chunks:
+        await delete_chunks_from(tenant, document_id, num_chunks)
+        logger.info(f"Deleted chunks {num_chunks}-{diff.num_stored - 1} of {tenant}:{document_id}")
+
+    return num_chunks, audit_indices
 
 async def upload_file(tenant:str, document_id:str, uploaded_file:UploadFile = File(...)) -> str:
     """
-    Indexing chunk to vector db and call background indexing agent tasks
+    Store the upload under its own job directory and queue the ingestion, returns the job id
     """
-    file_location = Path(f"temp/{uploaded_file.filename}")
+    job_id = uuid.uuid4().hex
+    filename = Path(uploaded_file.filename or "document.pdf").name
+    file_location = Path(f"temp/jobs/{job_id}/{filename}")
     file_location.parent.mkdir(parents=True, exist_ok=True)
     try:
         with file_location.open("wb") as out:
@@ -42,15 +145,42 @@ async def upload_file(tenant:str, document_id:str, uploaded_file:UploadFile = Fi
     finally:
         await uploaded_file.close()
 
-    full_text = ""
-    with pdfplumber.open(file_location) as pdf:
-        for page in pdf.pages:
-            full_text += page.extract_text() + "\n"
+    await create_job(job_id, tenant, document_id, filename)
+    ingest_document.delay(job_id=job_id, tenant=tenant, document_id=document_id, file_location=str(file_location), title=filename)
+
+    return job_id
 
-    chunks = chunk_text(full_text)
+async def ingest_file(job_id:str, tenant:str, document_id:str, file_location:Path, title:str):
+    """
+    Extract, embed and index a stored upload, then queue the audit of the chunks it changed
+    """
+    try:
+        await update_job(job_id, status="indexing")
+        num_chunks, audit_indices = await index_chunks(
+            tenant=tenant,
+            document_id=document_id,
+            title=title,
+            chunks=iter_chunks(iter_pages(file_location, job_id)),
+            job_id=job_id
+        )
+
+        await update_job(job_id, status="auditing" if audit_indices else "done", chunks_to_audit=len(audit_indices))
+        if audit_indices:
+            background_audit_chunks(tenant, document_id, num_chunks, audit_indices, job_id=job_id)
+    except Exception as e:
+        await update_job(job_id, status="failed", error=str(e))
+        raise
+    finally:
+        shutil.rmtree(file_location.parent, ignore_errors=True)
 
-    await add_document(tenant=tenant, doc_id=document_id, title=uploaded_file.filename, chunks=chunks)
-    
-    background_audit_chunks(tenant, document_id, len(chunks))
+# one event loop per worker process, the async Qdrant, Ollama and Redis clients stay bound to it between tasks
+worker_loop = None
 
-    return "File Indexing Success"
+@celery_app.task(name="ingest_document")
+def ingest_document(job_id:str, tenant:str, document_id:str, file_location:str, title:str):
+    global worker_loop
+    if worker_loop is None:
+        worker_loop = asyncio.new_event_loop()
+    logger.info(f"ingesting {tenant}:{document_id} for job {job_id}")
+    worker_loop.run_until_complete(ingest_file(job_id, tenant, document_id, Path(file_location), title))
+    return {"ingest": "finish", "job_id": job_id}
@@ -1 +1,5 @@
-from .embedding_service import embed_text
\ No newline at end of file
+from .embedding_service import embed_text, embed_texts, embed_texts_sync, get_embedding_dimension, get_embedding_dimension_sync
+from .sparse_embedding_service import sparse_embed_texts, sparse_embed_query
+from .embedding_cache_service import embed_query, embed_query_sync, get_embedding_cache_stats, LRUCache
+
+__all__ = ['embed_text', 'embed_texts', 'embed_texts_sync', 'get_embedding_dimension', 'get_embedding_dimension_sync', 'sparse_embed_texts', 'sparse_embed_query', 'embed_query', 'embed_query_sync', 'get_embedding_cache_stats', 'LRUCache']
\ No newline at end of file
@@ -0,0 +1,140 @@
+import os
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+import dotenv
+import numpy as np
+from redis_store import redis_client, async_redis_client
+from .embedding_service import OLLAMA_EMBED_MODEL, embed_texts, embed_texts_sync
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+EMBEDDING_CACHE_SIZE = int(os.environ.get("EMBEDDING_CACHE_SIZE", 1024))
+EMBEDDING_CACHE_TTL = int(os.environ.get("EMBEDDING_CACHE_TTL", 3600))
+EMBEDDING_CACHE_REDIS_TTL = int(os.environ.get("EMBEDDING_CACHE_REDIS_TTL", 7 * 24 * 3600))
+
+class LRUCache:
+    """
+    In-process LRU with a max number of entries and a TTL per entry
+    """
+    def __init__(self, max_size:int, ttl:int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+local_cache = LRUCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_TTL)
+stats = {"local_hits": 0, "redis_hits": 0, "misses": 0, "redis_errors": 0}
+
+def normalize_query(text:str) -> str:
+    return " ".join(text.split())
+
+def cache_key(normalized:str) -> str:
+    return f"embedding:{OLLAMA_EMBED_MODEL}:{hashlib.sha256(normalized.encode()).hexdigest()}"
+
+def to_bytes(vector:list[float]) -> bytes:
+    return np.asarray(vector, dtype=np.float32).tobytes()
+
+def from_bytes(raw:bytes) -> list[float]:
+    return np.frombuffer(raw, dtype=np.float32).tolist()
+
+async def embed_query(text:str) -> list[float]:
+    """
+    Query embedding through the in-process LRU, then the shared Redis tier, then Ollama
+    """
+    normalized = normalize_query(text)
+    key = cache_key(normalized)
+
+    raw = local_cache.get(key)
+    if raw is not None:
+        stats["local_hits"] += 1
+        return from_bytes(raw)
+
+    try:
+        raw = await async_redis_client.get(key)
+    except Exception as e:
+        stats["redis_errors"] += 1
+        logger.warning(f"embedding cache redis read failed: {e}")
+        raw = None
+
+    if raw is not None:
+        stats["redis_hits"] += 1
+        local_cache.set(key, raw)
+        return from_bytes(raw)
+
+    stats["misses"] += 1
+    vector = (await embed_texts([normalized]))[0]
+    raw = to_bytes(vector)
+    local_cache.set(key, raw)
+    try:
+        await async_redis_client.set(key, raw, ex=EMBEDDING_CACHE_REDIS_TTL)
+    except Exception as e:
+        stats["redis_errors"] += 1
+        logger.warning(f"embedding cache redis write failed: {e}")
+    return vector
+
+def embed_query_sync(text:str) -> list[float]:
+    normalized = normalize_query(text)
+    key = cache_key(normalized)
+
+    raw = local_cache.get(key)
+    if raw is not None:
+        stats["local_hits"] += 1
+        return from_bytes(raw)
+
+    try:
+        raw = redis_client.get(key)
+    except Exception as e:
+        stats["redis_errors"] += 1
+        logger.warning(f"embedding cache redis read failed: {e}")
+        raw = None
+
+    if raw is not None:
+        stats["redis_hits"] += 1
+        local_cache.set(key, raw)
+        return from_bytes(raw)
+
+    stats["misses"] += 1
+    vector = embed_texts_sync([normalized])[0]
+    raw = to_bytes(vector)
+    local_cache.set(key, raw)
+    try:
+        redis_client.set(key, raw, ex=EMBEDDING_CACHE_REDIS_TTL)
+    except Exception as e:
+        stats["redis_errors"] += 1
+        logger.warning(f"embedding cache redis write failed: {e}")
+    return vector
+
+def get_embedding_cache_stats() -> dict:
+    lookups = stats["local_hits"] + stats["redis_hits"] + stats["misses"]
+    return {
+        **stats,
+        "local_size": len(local_cache),
+        "hit_rate": (stats["local_hits"] + stats["redis_hits"]) / lookups if lookups else 0.0
+    }
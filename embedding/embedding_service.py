@@ -1,13 +1,64 @@
 import os
+import asyncio
 import dotenv
-from ollama import Client
+from ollama import Client, AsyncClient
 
 dotenv.load_dotenv()
 
 OLLAMA_EMBED_MODEL = os.environ.get("OLLAMA_EMBED_MODEL", "llama3.2:1b")
 OLLAMA_LOCAL_HOST = os.environ.get("OLLAMA_LOCAL_HOST", "http://localhost:11434")
+OLLAMA_EMBED_BATCH_SIZE = int(os.environ.get("OLLAMA_EMBED_BATCH_SIZE", 32))
+OLLAMA_EMBED_MAX_CONCURRENCY = int(os.environ.get("OLLAMA_EMBED_MAX_CONCURRENCY", 4))
 
 client = Client(host=OLLAMA_LOCAL_HOST)
+async_client = AsyncClient(host=OLLAMA_LOCAL_HOST)
+
+# bound the number of batches in flight so a big upload can't take every Ollama slot
+embed_semaphore = asyncio.Semaphore(OLLAMA_EMBED_MAX_CONCURRENCY)
 
 def embed_text(text: str) -> list[float]:
     return client.embed(model=OLLAMA_EMBED_MODEL, input=text)["embeddings"][0]
+
+def _batches(texts: list[str], batch_size: int) -> list[list[str]]:
+    return [texts[i:i + batch_size] for i in range(0, len(texts), batch_size)]
+
+async def embed_texts(texts: list[str], batch_size: int = OLLAMA_EMBED_BATCH_SIZE) -> list[list[float]]:
+    """
+    Embed many texts with one Ollama call per batch, running batches concurrently on the async client.
+    Output order follows input order.
+    """
+    async def embed_batch(batch: list[str]) -> list[list[float]]:
+        async with embed_semaphore:
+            response = await async_client.embed(model=OLLAMA_EMBED_MODEL, input=batch)
+            return response["embeddings"]
+
+    results = await asyncio.gather(*[embed_batch(batch) for batch in _batches(texts, batch_size)])
+    return [embedding for batch in results for embedding in batch]
+
+def embed_texts_sync(texts: list[str], batch_size: int = OLLAMA_EMBED_BATCH_SIZE) -> list[list[float]]:
+    """
+    Synchronous version of embed_texts for Celery workers, batches are sent one after another.
+    """
+    embeddings = []
+    for batch in _batches(texts, batch_size):
+        embeddings.extend(client.embed(model=OLLAMA_EMBED_MODEL, input=batch)["embeddings"])
+    return embeddings
+
+# optional, otherwise the size is probed from the model with one embedding call
+OLLAMA_EMBED_DIMENSION = os.environ.get("OLLAMA_EMBED_DIMENSION")
+embedding_dimension = int(OLLAMA_EMBED_DIMENSION) if OLLAMA_EMBED_DIMENSION else None
+
+async def get_embedding_dimension() -> int:
+    """
+    Vector size of OLLAMA_EMBED_MODEL, used when a collection is created
+    """
+    global embedding_dimension
+    if embedding_dimension is None:
+        embedding_dimension = len((await embed_texts(["dimension probe"]))[0])
+    return embedding_dimension
+
+def get_embedding_dimension_sync() -> int:
+    global embedding_dimension
+    if embedding_dimension is None:
+        embedding_dimension = len(embed_texts_sync(["dimension probe"])[0])
+    return embedding_dimension
@@ -0,0 +1,42 @@
+import os
+import re
+import zlib
+from collections import Counter
+import dotenv
+
+dotenv.load_dotenv()
+
+BM25_K1 = float(os.environ.get("BM25_K1", 1.2))
+BM25_B = float(os.environ.get("BM25_B", 0.75))
+# words per chunk, about 800 characters with the default chunker
+BM25_AVG_DOC_LENGTH = float(os.environ.get("BM25_AVG_DOC_LENGTH", 150))
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+def tokenize(text:str) -> list[str]:
+    return TOKEN_PATTERN.findall(text.lower())
+
+def token_index(token:str) -> int:
+    return zlib.crc32(token.encode())
+
+def sparse_embed_texts(texts:list[str]) -> list[tuple[list[int], list[float]]]:
+    """
+    BM25 term weights of documents as (indices, values), computed locally.
+    The IDF part depends on the whole collection and is applied by Qdrant (Modifier.IDF).
+    """
+    sparse_vectors = []
+    for text in texts:
+        tokens = tokenize(text)
+        length_norm = BM25_K1 * (1 - BM25_B + BM25_B * len(tokens) / BM25_AVG_DOC_LENGTH)
+        term_counts = Counter(token_index(token) for token in tokens)
+        indices = list(term_counts)
+        values = [count * (BM25_K1 + 1) / (count + length_norm) for count in term_counts.values()]
+        sparse_vectors.append((indices, values))
+    return sparse_vectors
+
+def sparse_embed_query(text:str) -> tuple[list[int], list[float]]:
+    """
+    Query terms weigh 1 each, so the score is the sum of BM25 weights of the matching terms
+    """
+    indices = list({token_index(token) for token in tokenize(text)})
+    return indices, [1.0] * len(indices)
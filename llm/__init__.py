@@ -1,3 +1,5 @@
 from .llm_service import responses, prompt_template, responses_sync
+from .llm_gateway import get_llm_stats
+from .response_cache_service import discard_cached_response
 
-__all__ = ['responses', 'prompt_template', 'responses_sync']
\ No newline at end of file
+__all__ = ['responses', 'prompt_template', 'responses_sync', 'get_llm_stats', 'discard_cached_response']
\ No newline at end of file
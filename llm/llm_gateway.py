@@ -0,0 +1,357 @@
+import asyncio
+import hashlib
+import json
+import logging
+import math
+import os
+import random
+import time
+import uuid
+from typing import AsyncIterator, Awaitable, Callable
+import dotenv
+import httpx
+import redis
+from ollama import ChatResponse, ResponseError
+from redis_store import redis_client, async_redis_client
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# calls in flight per backend across the API and every worker, the rest poll for a free slot
+LLM_LOCAL_MAX_CONCURRENCY = int(os.environ.get("LLM_LOCAL_MAX_CONCURRENCY", 4))
+LLM_CLOUD_MAX_CONCURRENCY = int(os.environ.get("LLM_CLOUD_MAX_CONCURRENCY", 16))
+# seconds between two tries for a slot while all of them are taken
+LLM_SLOT_POLL_INTERVAL = float(os.environ.get("LLM_SLOT_POLL_INTERVAL", 0.05))
+# seconds, used when the caller gives no timeout, queueing and retries count against it
+LLM_TIMEOUT = float(os.environ.get("LLM_TIMEOUT", 120))
+LLM_MAX_RETRIES = int(os.environ.get("LLM_MAX_RETRIES", 2))
+LLM_RETRY_BASE_DELAY = float(os.environ.get("LLM_RETRY_BASE_DELAY", 0.5))
+LLM_RETRY_MAX_DELAY = float(os.environ.get("LLM_RETRY_MAX_DELAY", 8))
+# identical non-streamed calls in flight at the same time share one upstream call, sync calls across processes
+LLM_COALESCE = os.environ.get("LLM_COALESCE", "true").lower() == "true"
+
+TRANSIENT_STATUS_CODES = {408, 429, 500, 502, 503, 504}
+
+SLOT_LIMITS = {
+    "local": LLM_LOCAL_MAX_CONCURRENCY,
+    "cloud": LLM_CLOUD_MAX_CONCURRENCY,
+}
+
+# the slots of a backend are a sorted set of holder tokens scored by lease expiry,
+# leases of holders that died without releasing are dropped before counting
+ACQUIRE_SLOT_SCRIPT = """
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', ARGV[2])
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[1]) then
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[4])
+    return 1
+end
+return 0
+"""
+acquire_slot_script = redis_client.register_script(ACQUIRE_SLOT_SCRIPT)
+async_acquire_slot_script = async_redis_client.register_script(ACQUIRE_SLOT_SCRIPT)
+
+model_stats = {}
+
+def backend(model:str) -> str:
+    return "cloud" if "cloud" in model else "local"
+
+def slot_key(model:str) -> str:
+    return f"llm_slots:{backend(model)}"
+
+def slot_args(model:str, deadline:float, token:str) -> list:
+    """
+    A slot is leased until LLM_TIMEOUT past the caller's deadline, a sync read can outlive the deadline by one timeout
+    """
+    now = time.time()
+    return [SLOT_LIMITS[backend(model)], now, now + remaining(deadline) + LLM_TIMEOUT, token]
+
+def stats_of(model:str) -> dict:
+    return model_stats.setdefault(model, {
+        "queued": 0, "in_flight": 0, "calls": 0, "errors": 0, "retries": 0, "coalesced": 0,
+        "total_ms": 0.0, "max_ms": 0.0, "queue_wait_total_ms": 0.0, "queue_wait_max_ms": 0.0
+    })
+
+def record_latency(stats:dict, prefix:str, started_at:float):
+    elapsed_ms = (time.perf_counter() - started_at) * 1000
+    stats[f"{prefix}total_ms"] += elapsed_ms
+    stats[f"{prefix}max_ms"] = max(stats[f"{prefix}max_ms"], elapsed_ms)
+
+def get_llm_stats() -> dict:
+    return {
+        model: {
+            **stats,
+            "avg_ms": stats["total_ms"] / stats["calls"] if stats["calls"] else 0.0,
+            "queue_wait_avg_ms": stats["queue_wait_total_ms"] / stats["calls"] if stats["calls"] else 0.0,
+        }
+        for model, stats in model_stats.items()
+    }
+
+def remaining(deadline:float) -> float:
+    return max(deadline - time.monotonic(), 0)
+
+def is_transient(error:Exception) -> bool:
+    if isinstance(error, ResponseError):
+        return error.status_code in TRANSIENT_STATUS_CODES
+    # a timed out read already used the caller's time, it isn't retried
+    if isinstance(error, httpx.TimeoutException):
+        return False
+    return isinstance(error, (ConnectionError, httpx.TransportError))
+
+def retry_delay(attempt:int) -> float:
+    """
+    Full jitter, callers that failed together don't retry together
+    """
+    return random.uniform(0, min(LLM_RETRY_MAX_DELAY, LLM_RETRY_BASE_DELAY * 2 ** attempt))
+
+def should_retry(error:Exception, attempt:int, delay:float, deadline:float) -> bool:
+    return attempt < LLM_MAX_RETRIES and is_transient(error) and time.monotonic() + delay < deadline
+
+def request_key(model:str, messages:list, tools:list) -> str:
+    payload = json.dumps({"model": model, "messages": messages, "tools": tools}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+async def take_slot(model:str, deadline:float) -> str | None:
+    """
+    Poll the shared slots of the model's backend until one is free, raises TimeoutError at the deadline.
+    Returns None without a slot when Redis can't be reached, calls aren't blocked by the limiter.
+    """
+    token = uuid.uuid4().hex
+    while True:
+        try:
+            if await async_acquire_slot_script(keys=[slot_key(model)], args=slot_args(model, deadline, token)):
+                return token
+        except redis.RedisError as e:
+            logger.error(f"LLM slot limiter unavailable, calling {model} without a slot: {e}")
+            return None
+        if remaining(deadline) <= 0:
+            raise TimeoutError(f"no {backend(model)} LLM slot free before the deadline")
+        await asyncio.sleep(min(LLM_SLOT_POLL_INTERVAL, remaining(deadline)))
+
+async def acquire(model:str, deadline:float) -> str | None:
+    stats = stats_of(model)
+    stats["queued"] += 1
+    queued_at = time.perf_counter()
+    try:
+        token = await take_slot(model, deadline)
+    finally:
+        stats["queued"] -= 1
+        record_latency(stats, "queue_wait_", queued_at)
+    stats["in_flight"] += 1
+    stats["calls"] += 1
+    return token
+
+def record_release(model:str, started_at:float):
+    stats = stats_of(model)
+    stats["in_flight"] -= 1
+    record_latency(stats, "", started_at)
+
+async def release(model:str, token:str | None, started_at:float):
+    record_release(model, started_at)
+    if token is None:
+        return
+    try:
+        await async_redis_client.zrem(slot_key(model), token)
+    except redis.RedisError as e:
+        logger.error(f"failed to release {backend(model)} LLM slot, it frees at its lease expiry: {e}")
+
+async def call(model:str, request:Callable[[], Awaitable], deadline:float):
+    """
+    Run request() in a slot of the model's backend, transient errors are retried with jittered backoff until the deadline
+    """
+    attempt = 0
+    while True:
+        token = await acquire(model, deadline)
+        started_at = time.perf_counter()
+        try:
+            return await asyncio.wait_for(request(), remaining(deadline))
+        except Exception as e:
+            delay = retry_delay(attempt)
+            if not should_retry(e, attempt, delay, deadline):
+                stats_of(model)["errors"] += 1
+                raise
+            stats_of(model)["retries"] += 1
+            logger.warning(f"{model} call failed with {e!r}, retry {attempt + 1} in {delay:.2f}s")
+        finally:
+            await release(model, token, started_at)
+        await asyncio.sleep(delay)
+        attempt += 1
+
+in_flight_calls = {}
+
+def forget_flight(flights:dict, key:str, flight):
+    if flights.get(key) is flight:
+        flights.pop(key)
+
+async def coalesced_call(key:str, model:str, request:Callable[[], Awaitable], deadline:float):
+    """
+    Callers with the same key share the first caller's call, each one still waits only until its own deadline.
+    The shared call runs until the first caller's deadline, a caller with time left after it timed out
+    makes its own call.
+    """
+    while True:
+        task = in_flight_calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(call(model, request, deadline))
+            in_flight_calls[key] = task
+            task.add_done_callback(lambda done: forget_flight(in_flight_calls, key, done))
+        else:
+            stats_of(model)["coalesced"] += 1
+        try:
+            return await asyncio.wait_for(asyncio.shield(task), remaining(deadline))
+        except TimeoutError:
+            if remaining(deadline) <= 0 or not task.done():
+                raise
+            forget_flight(in_flight_calls, key, task)
+
+async def stream(model:str, request:Callable[[], Awaitable[AsyncIterator]], deadline:float) -> AsyncIterator:
+    """
+    Streamed call that keeps its slot until the last part. Errors before the first part are retried,
+    later ones are raised since parts were already handed out. Raises TimeoutError at the deadline.
+    """
+    attempt = 0
+    while True:
+        token = await acquire(model, deadline)
+        started_at = time.perf_counter()
+        parts = None
+        try:
+            parts = await asyncio.wait_for(request(), remaining(deadline))
+            first_part = await asyncio.wait_for(anext(parts), remaining(deadline))
+            break
+        except StopAsyncIteration:
+            await release(model, token, started_at)
+            return
+        except Exception as e:
+            await release(model, token, started_at)
+            if parts is not None:
+                await parts.aclose()
+            delay = retry_delay(attempt)
+            if not should_retry(e, attempt, delay, deadline):
+                stats_of(model)["errors"] += 1
+                raise
+            stats_of(model)["retries"] += 1
+            logger.warning(f"{model} stream failed with {e!r}, retry {attempt + 1} in {delay:.2f}s")
+        await asyncio.sleep(delay)
+        attempt += 1
+
+    try:
+        yield first_part
+        while True:
+            try:
+                part = await asyncio.wait_for(anext(parts), remaining(deadline))
+            except StopAsyncIteration:
+                return
+            yield part
+    except Exception:
+        stats_of(model)["errors"] += 1
+        raise
+    finally:
+        await parts.aclose()
+        await release(model, token, started_at)
+
+########################### Syncronous client #################################
+
+def take_slot_sync(model:str, deadline:float) -> str | None:
+    token = uuid.uuid4().hex
+    while True:
+        try:
+            if acquire_slot_script(keys=[slot_key(model)], args=slot_args(model, deadline, token)):
+                return token
+        except redis.RedisError as e:
+            logger.error(f"LLM slot limiter unavailable, calling {model} without a slot: {e}")
+            return None
+        if remaining(deadline) <= 0:
+            raise TimeoutError(f"no {backend(model)} LLM slot free before the deadline")
+        time.sleep(min(LLM_SLOT_POLL_INTERVAL, remaining(deadline)))
+
+def acquire_sync(model:str, deadline:float) -> str | None:
+    stats = stats_of(model)
+    stats["queued"] += 1
+    queued_at = time.perf_counter()
+    try:
+        token = take_slot_sync(model, deadline)
+    finally:
+        stats["queued"] -= 1
+        record_latency(stats, "queue_wait_", queued_at)
+    stats["in_flight"] += 1
+    stats["calls"] += 1
+    return token
+
+def release_sync(model:str, token:str | None, started_at:float):
+    record_release(model, started_at)
+    if token is None:
+        return
+    try:
+        redis_client.zrem(slot_key(model), token)
+    except redis.RedisError as e:
+        logger.error(f"failed to release {backend(model)} LLM slot, it frees at its lease expiry: {e}")
+
+def call_sync(model:str, request:Callable, deadline:float):
+    attempt = 0
+    while True:
+        token = acquire_sync(model, deadline)
+        started_at = time.perf_counter()
+        try:
+            return request()
+        except Exception as e:
+            delay = retry_delay(attempt)
+            if not should_retry(e, attempt, delay, deadline):
+                stats_of(model)["errors"] += 1
+                raise
+            stats_of(model)["retries"] += 1
+            logger.warning(f"{model} call failed with {e!r}, retry {attempt + 1} in {delay:.2f}s")
+        finally:
+            release_sync(model, token, started_at)
+        time.sleep(delay)
+        attempt += 1
+
+# a finished flight's response stays readable this long for the callers that polled for it
+COALESCE_RESULT_TTL = 60
+
+def flight_result_key(key:str, leader:str) -> str:
+    return f"llm_flight_result:{key}:{leader}"
+
+def coalesced_call_sync(key:str, model:str, request:Callable, deadline:float) -> ChatResponse:
+    """
+    Identical calls share one upstream call across every process. The first caller takes the flight key
+    with SET NX and publishes the response under its own token, the others poll for it. When the leader
+    fails or dies its flight key goes away without a result and a waiting caller takes over with its
+    own budget. Without Redis the call is made directly.
+    """
+    flight_key = f"llm_flight:{key}"
+    token = uuid.uuid4().hex
+    watched = None
+    while True:
+        try:
+            if watched is not None:
+                result = redis_client.get(flight_result_key(key, watched))
+                if result is not None:
+                    return ChatResponse.model_validate_json(result)
+            if redis_client.set(flight_key, token, nx=True, ex=math.ceil(remaining(deadline) + LLM_TIMEOUT)):
+                break
+            leader = redis_client.get(flight_key)
+        except redis.RedisError as e:
+            logger.error(f"LLM call coalescing unavailable, calling {model} directly: {e}")
+            return call_sync(model, request, deadline)
+        if leader is None:
+            continue
+        if watched is None:
+            stats_of(model)["coalesced"] += 1
+        watched = leader.decode()
+        if remaining(deadline) <= 0:
+            raise TimeoutError(f"shared {model} call didn't finish before the deadline")
+        time.sleep(min(LLM_SLOT_POLL_INTERVAL, remaining(deadline)))
+
+    response = None
+    try:
+        response = call_sync(model, request, deadline)
+        return response
+    finally:
+        try:
+            with redis_client.pipeline(transaction=True) as pipe:
+                if response is not None:
+                    pipe.set(flight_result_key(key, token), response.model_dump_json(), ex=COALESCE_RESULT_TTL)
+                pipe.delete(flight_key)
+                pipe.execute()
+        except redis.RedisError as e:
+            logger.error(f"failed to publish coalesced {model} response: {e}")
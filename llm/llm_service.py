@@ -1,5 +1,8 @@
 from ollama import ChatResponse, AsyncClient, Client
 from typing import Union
+from .response_cache_service import get_cached_response, cache_response
+from .llm_gateway import call, coalesced_call, stream as gateway_stream, call_sync, coalesced_call_sync, request_key, LLM_TIMEOUT, LLM_COALESCE
+import time
 import os
 import dotenv
 
@@ -24,7 +27,11 @@ def prompt_template(prompt: str, variables: dict) -> str:
         prompt = prompt.replace(f"{{{key}}}", value)
     return prompt
 
-async def responses(message: Union[str, list], model: str, tools: list = [], stream: str = False, think: Union[bool, str] = False) -> str: 
+async def responses(message: Union[str, list], model: str, tools: list = [], stream: str = False, think: Union[bool, str] = False, timeout: float | None = None) -> str: 
+    """
+    timeout is in seconds and covers the whole call including the wait for a free slot and retries,
+    for a stream it runs until the last part. Defaults to LLM_TIMEOUT.
+    """
     if isinstance(message, str):
         message = [
             {
@@ -38,25 +45,39 @@ async def responses(message: Union[str, list], model: str, tools: list = [], str
     else:
         client = local_client
 
-    response: ChatResponse = await client.chat(
+    deadline = time.monotonic() + (LLM_TIMEOUT if timeout is None else timeout)
+    request = lambda: client.chat(
         model=model, 
         messages=message,
         tools = tools,
         stream=stream
-    ) 
+    )
+
+    if stream:
+        return gateway_stream(model, request, deadline)
+    if LLM_COALESCE:
+        return await coalesced_call(request_key(model, message, tools), model, request, deadline)
+    response: ChatResponse = await call(model, request, deadline)
     return response
 
 
 local_client_sync = Client(
-    host=OLLAMA_LOCAL_HOST
+    host=OLLAMA_LOCAL_HOST,
+    timeout=LLM_TIMEOUT
 )
 
 cloud_client_sync = Client(
     host=OLLAMA_CLOUD_HOST,
-    headers={'Authorization': 'Bearer ' + OLLAMA_API_KEY}
+    headers={'Authorization': 'Bearer ' + OLLAMA_API_KEY},
+    timeout=LLM_TIMEOUT
 )
 
-def responses_sync(message: Union[str, list], model: str, tools: list = [], stream: str = False, think: Union[bool, str] = False) -> str: 
+def responses_sync(message: Union[str, list], model: str, tools: list = [], stream: str = False, think: Union[bool, str] = False, timeout: float | None = None, cache: bool = False) -> str: 
+    """
+    timeout covers the wait for a free slot and retries, a single HTTP read is bounded by LLM_TIMEOUT.
+    Streams bypass the gateway. With cache, a response to the same model and messages is reused
+    from the persistent response cache, meant for deterministic background prompts.
+    """
     if isinstance(message, str):
         message = [
             {
@@ -70,11 +91,29 @@ def responses_sync(message: Union[str, list], model: str, tools: list = [], stre
     else:
         client = local_client_sync
 
-    response: ChatResponse = client.chat(
+    deadline = time.monotonic() + (LLM_TIMEOUT if timeout is None else timeout)
+    request = lambda: client.chat(
         model=model, 
         messages=message,
         tools = tools,
         stream=stream
-    ) 
+    )
+
+    if stream:
+        return request()
+
+    cache = cache and not tools
+    if cache:
+        response = get_cached_response(message, model)
+        if response is not None:
+            return response
+
+    if LLM_COALESCE:
+        response: ChatResponse = coalesced_call_sync(request_key(model, message, tools), model, request, deadline)
+    else:
+        response: ChatResponse = call_sync(model, request, deadline)
+
+    if cache:
+        cache_response(message, model, response)
     return response
 
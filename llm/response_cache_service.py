@@ -0,0 +1,150 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import sqlite3
+import threading
+import dotenv
+import redis
+from redis_store import redis_client
+from ollama import ChatResponse
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# redis: shared by every worker, disk: SQLite file per host, none: disabled
+LLM_RESPONSE_CACHE = os.environ.get("LLM_RESPONSE_CACHE", "redis")
+LLM_RESPONSE_CACHE_TTL = int(os.environ.get("LLM_RESPONSE_CACHE_TTL", 30 * 24 * 3600))
+LLM_RESPONSE_CACHE_MAX_ENTRIES = int(os.environ.get("LLM_RESPONSE_CACHE_MAX_ENTRIES", 100000))
+LLM_RESPONSE_CACHE_PATH = os.environ.get("LLM_RESPONSE_CACHE_PATH", ".cache/llm_responses.sqlite")
+
+# sorted set of cached keys by write time, used to evict the oldest entries past the size limit
+REDIS_INDEX_KEY = "llm_response_index"
+
+def normalize_messages(message:list[dict]) -> str:
+    return json.dumps(
+        [{"role": item.get("role"), "content": " ".join(str(item.get("content") or "").split())} for item in message],
+        sort_keys=True
+    )
+
+def response_key(message:list[dict], model:str) -> str:
+    return f"llm_response:{model}:{hashlib.sha256(normalize_messages(message).encode()).hexdigest()}"
+
+class DiskResponseCache:
+    """
+    SQLite store shared by the worker processes of one host. Expired entries are dropped on write
+    and the least recently read ones go once there are more than max_entries.
+    """
+    def __init__(self, path:str, ttl:int, max_entries:int):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.local = threading.local()
+
+    def connection(self) -> sqlite3.Connection:
+        # one connection per thread, and per process since Celery forks after import
+        if getattr(self.local, "pid", None) != os.getpid():
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            connection = sqlite3.connect(self.path, timeout=30)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("CREATE TABLE IF NOT EXISTS responses (key TEXT PRIMARY KEY, value TEXT, created_at REAL, accessed_at REAL)")
+            self.local.connection, self.local.pid = connection, os.getpid()
+        return self.local.connection
+
+    def get(self, key:str) -> str | None:
+        connection = self.connection()
+        now = time.time()
+        row = connection.execute("SELECT value FROM responses WHERE key = ? AND created_at > ?", (key, now - self.ttl)).fetchone()
+        if row is None:
+            return None
+        with connection:
+            connection.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return row[0]
+
+    def set(self, key:str, value:str):
+        connection = self.connection()
+        now = time.time()
+        with connection:
+            connection.execute("INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)", (key, value, now, now))
+            connection.execute("DELETE FROM responses WHERE created_at <= ?", (now - self.ttl,))
+            connection.execute(
+                "DELETE FROM responses WHERE key IN (SELECT key FROM responses ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)",
+                (self.max_entries,)
+            )
+
+    def delete(self, key:str):
+        with self.connection() as connection:
+            connection.execute("DELETE FROM responses WHERE key = ?", (key,))
+
+class RedisResponseCache:
+    """
+    Entries expire with the TTL, the oldest writes are evicted once there are more than max_entries
+    """
+    def __init__(self, client:redis.Redis, ttl:int, max_entries:int):
+        self.client = client
+        self.ttl = ttl
+        self.max_entries = max_entries
+
+    def get(self, key:str) -> str | None:
+        value = self.client.get(key)
+        return None if value is None else value.decode()
+
+    def set(self, key:str, value:str):
+        now = time.time()
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.set(key, value, ex=self.ttl)
+            pipe.zadd(REDIS_INDEX_KEY, {key: now})
+            pipe.zremrangebyscore(REDIS_INDEX_KEY, "-inf", now - self.ttl)
+            pipe.zcard(REDIS_INDEX_KEY)
+            size = pipe.execute()[-1]
+        if size > self.max_entries:
+            evicted = [item for item, _ in self.client.zpopmin(REDIS_INDEX_KEY, size - self.max_entries)]
+            if evicted:
+                self.client.delete(*evicted)
+
+    def delete(self, key:str):
+        with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(key)
+            pipe.zrem(REDIS_INDEX_KEY, key)
+            pipe.execute()
+
+if LLM_RESPONSE_CACHE == "redis":
+    response_cache = RedisResponseCache(redis_client, LLM_RESPONSE_CACHE_TTL, LLM_RESPONSE_CACHE_MAX_ENTRIES)
+elif LLM_RESPONSE_CACHE == "disk":
+    response_cache = DiskResponseCache(LLM_RESPONSE_CACHE_PATH, LLM_RESPONSE_CACHE_TTL, LLM_RESPONSE_CACHE_MAX_ENTRIES)
+else:
+    response_cache = None
+
+def get_cached_response(message:list[dict], model:str) -> ChatResponse | None:
+    if response_cache is None:
+        return None
+    try:
+        value = response_cache.get(response_key(message, model))
+    except Exception as e:
+        logger.error(f"failed to read LLM response cache: {e}")
+        return None
+    if value is None:
+        return None
+    logger.info(f"LLM response cache hit for {model}")
+    return ChatResponse.model_validate_json(value)
+
+def cache_response(message:list[dict], model:str, response:ChatResponse):
+    if response_cache is None:
+        return
+    try:
+        response_cache.set(response_key(message, model), response.model_dump_json())
+    except Exception as e:
+        logger.error(f"failed to write LLM response cache: {e}")
+
+def discard_cached_response(message:list[dict], model:str):
+    """
+    Drop a cached response the caller couldn't use, so the next identical call asks the model again
+    """
+    if response_cache is None:
+        return
+    try:
+        response_cache.delete(response_key(message, model))
+    except Exception as e:
+        logger.error(f"failed to delete from LLM response cache: {e}")
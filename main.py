@@ -1,6 +1,7 @@
 from fastapi import FastAPI
 from chat import chat_router
 from documents import documents_router
+from metrics import metrics_router
 import logging
 
 logging.basicConfig(
@@ -17,3 +18,4 @@ app = FastAPI(
 
 app.include_router(documents_router, prefix="/api/v1")
 app.include_router(chat_router, prefix="/api/v1")
+app.include_router(metrics_router, prefix="/api/v1")
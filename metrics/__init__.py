@@ -0,0 +1,3 @@
+from .metrics_controller import metrics_router
+
+__all__ = ["metrics_router"]
\ No newline at end of file
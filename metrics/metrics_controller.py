@@ -0,0 +1,39 @@
+from fastapi import APIRouter
+from embedding import get_embedding_cache_stats
+from chat_history import get_chat_history_stats
+from answer_cache import get_answer_cache_stats
+from vector_db import get_retrieval_cache_stats
+from llm import get_llm_stats
+from background_tasks.fair_scheduling import get_tenant_queue_stats, get_pending_by_tenant
+
+metrics_router = APIRouter(prefix="/metrics", tags=["metrics"])
+
+@metrics_router.get(
+        "/",
+        summary="Service Metrics",
+        description="Cache and client counters of this API process"
+)
+async def get_metrics():
+    return {
+        "embedding_cache": get_embedding_cache_stats(),
+        "chat_history": get_chat_history_stats(),
+        "answer_cache": get_answer_cache_stats(),
+        "retrieval_cache": get_retrieval_cache_stats(),
+        "llm": get_llm_stats()
+    }
+
+@metrics_router.get(
+        "/tenants",
+        summary="Tenant Queue Overview",
+        description="Pending audit chunks of every tenant with queued work, shared by the API and workers"
+)
+def get_tenant_queues():
+    return {"audit": get_pending_by_tenant("audit")}
+
+@metrics_router.get(
+        "/tenants/{tenant}",
+        summary="Tenant Queue Metrics",
+        description="Pending, enqueued and throttled audit chunks and last queue latency of a tenant"
+)
+def get_tenant_metrics(tenant:str):
+    return {"tenant": tenant, "audit": get_tenant_queue_stats(tenant, "audit")}
@@ -0,0 +1,3 @@
+from .redis_store_service import redis_client, async_redis_client, REDIS_HOST, REDIS_PORT, REDIS_PASSWORD
+
+__all__ = ['redis_client', 'async_redis_client', 'REDIS_HOST', 'REDIS_PORT', 'REDIS_PASSWORD']
\ No newline at end of file
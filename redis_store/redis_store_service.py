@@ -0,0 +1,15 @@
+import os
+import dotenv
+import redis
+import redis.asyncio as async_redis
+
+dotenv.load_dotenv()
+
+REDIS_HOST = os.environ.get('REDIS_HOST')
+REDIS_PORT = os.environ.get('REDIS_PORT')
+REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD')
+
+# shared by the caches, the LLM gateway and the document generation counter,
+# chat history keeps its own blocking pool sized for the API
+redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD)
+async_redis_client = async_redis.Redis(host=REDIS_HOST, port=REDIS_PORT, password=REDIS_PASSWORD)
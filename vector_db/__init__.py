@@ -1,3 +1,4 @@
-from .vector_db_service import search_documents, add_document, update_point, get_point, update_point_sync, get_point_sync
+from .vector_db_service import search_documents, search_documents_sync, get_retrieval_cache_stats, document_collection_name, add_document, add_chunks, ensure_collection, update_point, update_points, get_point, get_points, update_point_sync, update_points_sync, set_payloads_sync, get_point_sync, get_points_sync
+from .document_generation_service import get_document_generation, get_document_generation_sync
 
-__all__ = ['search_similar_documents', 'add_document', 'update_point', 'get_point', 'update_point_sync', 'get_point_sync']
\ No newline at end of file
+__all__ = ['search_documents', 'search_documents_sync', 'get_retrieval_cache_stats', 'document_collection_name', 'add_document', 'add_chunks', 'ensure_collection', 'update_point', 'update_points', 'get_point', 'get_points', 'update_point_sync', 'update_points_sync', 'set_payloads_sync', 'get_point_sync', 'get_points_sync', 'get_document_generation', 'get_document_generation_sync']
\ No newline at end of file
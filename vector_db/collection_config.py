@@ -0,0 +1,84 @@
+from qdrant_client import models
+import os
+import dotenv
+
+dotenv.load_dotenv()
+
+# memory: float32 vectors in RAM
+# compact: int8 quantized vectors in RAM, originals on disk for rescoring (~4x less RAM)
+# binary: 1 bit per dimension in RAM, originals on disk for rescoring (~32x less RAM, for high-dimensional models)
+STORAGE_PROFILES = {
+    "memory": {"quantization": "none", "on_disk": False, "oversampling": 1.0},
+    "compact": {"quantization": "int8", "on_disk": True, "oversampling": 2.0},
+    "binary": {"quantization": "binary", "on_disk": True, "oversampling": 3.0},
+}
+
+QDRANT_STORAGE_PROFILE = os.environ.get("QDRANT_STORAGE_PROFILE", "memory")
+storage_profile = STORAGE_PROFILES[QDRANT_STORAGE_PROFILE]
+
+# each setting of the profile can be overridden on its own
+QDRANT_QUANTIZATION = os.environ.get("QDRANT_QUANTIZATION", storage_profile["quantization"])
+QDRANT_VECTORS_ON_DISK = os.environ.get("QDRANT_VECTORS_ON_DISK", str(storage_profile["on_disk"])).lower() == "true"
+QDRANT_QUANTIZATION_RESCORE = os.environ.get("QDRANT_QUANTIZATION_RESCORE", "true").lower() == "true"
+QDRANT_QUANTIZATION_OVERSAMPLING = float(os.environ.get("QDRANT_QUANTIZATION_OVERSAMPLING", storage_profile["oversampling"]))
+QDRANT_HNSW_M = int(os.environ.get("QDRANT_HNSW_M", 16))
+QDRANT_HNSW_EF_CONSTRUCT = int(os.environ.get("QDRANT_HNSW_EF_CONSTRUCT", 100))
+QDRANT_SEARCH_EF = int(os.environ.get("QDRANT_SEARCH_EF", 128))
+
+# dense + BM25 sparse vectors fused with RRF, only for collections created with the sparse vector
+HYBRID_SEARCH = os.environ.get("HYBRID_SEARCH", "true").lower() == "true"
+HYBRID_PREFETCH_LIMIT = int(os.environ.get("HYBRID_PREFETCH_LIMIT", 20))
+BM25_VECTOR = "bm25"
+
+TENANT_INDEX_SCHEMA = models.KeywordIndexParams(type=models.KeywordIndexType.KEYWORD, is_tenant=True)
+# chunks of one document are listed and cut by these during re-indexing
+DOCUMENT_INDEX_SCHEMAS = {
+    "doc_id": models.PayloadSchemaType.KEYWORD,
+    "index": models.PayloadSchemaType.INTEGER,
+}
+
+def quantization_config() -> models.ScalarQuantization | models.BinaryQuantization | None:
+    if QDRANT_QUANTIZATION == "int8":
+        return models.ScalarQuantization(
+            scalar=models.ScalarQuantizationConfig(type=models.ScalarType.INT8, quantile=0.99, always_ram=True)
+        )
+    if QDRANT_QUANTIZATION == "binary":
+        return models.BinaryQuantization(binary=models.BinaryQuantizationConfig(always_ram=True))
+    return None
+
+def collection_config(vector_size:int, shared:bool = False, hybrid:bool = HYBRID_SEARCH) -> dict:
+    """
+    create_collection arguments. The shared collection skips the global HNSW graph
+    and builds one graph per tenant on the is_tenant payload index instead.
+    Hybrid collections get a BM25 sparse vector next to the unnamed dense one, Qdrant applies the IDF.
+    """
+    return {
+        "vectors_config": models.VectorParams(
+            size=vector_size,
+            distance=models.Distance.COSINE,
+            on_disk=QDRANT_VECTORS_ON_DISK,
+        ),
+        "hnsw_config": models.HnswConfigDiff(
+            m=0 if shared else QDRANT_HNSW_M,
+            payload_m=QDRANT_HNSW_M if shared else None,
+            ef_construct=QDRANT_HNSW_EF_CONSTRUCT,
+        ),
+        "quantization_config": quantization_config(),
+        "sparse_vectors_config": {BM25_VECTOR: models.SparseVectorParams(modifier=models.Modifier.IDF)} if hybrid else None,
+    }
+
+def is_hybrid(collection_info:models.CollectionInfo) -> bool:
+    return BM25_VECTOR in (collection_info.config.params.sparse_vectors or {})
+
+def search_params() -> models.SearchParams:
+    """
+    Quantized searches go over the compressed vectors first and rescore the top
+    limit * oversampling candidates with the original vectors
+    """
+    quantization = None
+    if quantization_config() is not None:
+        quantization = models.QuantizationSearchParams(
+            rescore=QDRANT_QUANTIZATION_RESCORE,
+            oversampling=QDRANT_QUANTIZATION_OVERSAMPLING,
+        )
+    return models.SearchParams(hnsw_ef=QDRANT_SEARCH_EF, quantization=quantization)
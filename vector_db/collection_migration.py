@@ -0,0 +1,91 @@
+"""
+Move the per-tenant collections (tenants_{tenant}_documents) into the shared collection.
+
+    python -m vector_db.collection_migration --batch-size 256 --delete-source
+
+Point ids already contain the tenant, so they are kept and the migration can be re-run.
+A source collection is only deleted when the shared collection holds at least as many points of its tenant.
+Set QDRANT_COLLECTION_LAYOUT=shared once it's done.
+"""
+import argparse
+import json
+import logging
+import re
+from qdrant_client import models
+from .vector_db_service import sync_qdrant_client, ensure_collection_sync, collection_is_hybrid_sync, point_vectors, QDRANT_SHARED_COLLECTION
+
+logger = logging.getLogger(__name__)
+
+TENANT_COLLECTION_PATTERN = re.compile(r"^tenants_(?P<tenant>.+)_documents$")
+
+def shared_vector(point, hybrid:bool):
+    """
+    Vector of a point in the shared collection, BM25 vectors are added or dropped to match it
+    """
+    if isinstance(point.vector, dict):
+        return point.vector if hybrid else point.vector[""]
+    if hybrid:
+        return point_vectors([point.vector], [point.payload['text']], True)[0]
+    return point.vector
+
+def migrate_collection(collection_name:str, tenant:str, batch_size:int) -> int:
+    hybrid = collection_is_hybrid_sync(QDRANT_SHARED_COLLECTION)
+    moved = 0
+    offset = None
+    while True:
+        points, offset = sync_qdrant_client.scroll(
+            collection_name=collection_name,
+            limit=batch_size,
+            offset=offset,
+            with_payload=True,
+            with_vectors=True
+        )
+        if points:
+            sync_qdrant_client.upsert(
+                collection_name=QDRANT_SHARED_COLLECTION,
+                points=[
+                    models.PointStruct(id=point.id, vector=shared_vector(point, hybrid), payload={**point.payload, "tenant": point.payload.get("tenant", tenant)})
+                    for point in points
+                ],
+                wait=True
+            )
+            moved += len(points)
+        if offset is None:
+            return moved
+
+def migrate(batch_size:int = 256, delete_source:bool = False) -> dict:
+    ensure_collection_sync(QDRANT_SHARED_COLLECTION)
+
+    report = {}
+    for collection in sync_qdrant_client.get_collections().collections:
+        match = TENANT_COLLECTION_PATTERN.match(collection.name)
+        if not match or collection.name == QDRANT_SHARED_COLLECTION:
+            continue
+
+        tenant = match["tenant"]
+        moved = migrate_collection(collection.name, tenant, batch_size)
+        source_count = sync_qdrant_client.count(collection_name=collection.name, exact=True).count
+        shared_count = sync_qdrant_client.count(
+            collection_name=QDRANT_SHARED_COLLECTION,
+            count_filter=models.Filter(must=[models.FieldCondition(key="tenant", match=models.MatchValue(value=tenant))]),
+            exact=True
+        ).count
+
+        deleted = False
+        if delete_source and shared_count >= source_count:
+            sync_qdrant_client.delete_collection(collection_name=collection.name)
+            deleted = True
+
+        report[tenant] = {"source": collection.name, "moved": moved, "source_count": source_count, "shared_count": shared_count, "deleted": deleted}
+        logger.info(f"migrated {collection.name}: {report[tenant]}")
+
+    return report
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Move per-tenant collections into the shared collection")
+    parser.add_argument("--batch-size", type=int, default=256)
+    parser.add_argument("--delete-source", action="store_true", help="drop each per-tenant collection once its points are verified")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    print(json.dumps(migrate(batch_size=args.batch_size, delete_source=args.delete_source), indent=2))
@@ -0,0 +1,34 @@
+import hashlib
+
+def content_hash(text:str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+class DocumentDiff:
+    """
+    Content hashes of the chunks a document had before re-indexing, by index.
+    A chunk whose hash is already stored at its index is unchanged. One stored at another index
+    (text shifted by an edit earlier in the document) can be copied from there instead of embedded.
+    Indices leave the diff once they are overwritten, the points the last batch overwrote are
+    kept in memory by hash so text shifted across a batch boundary can still be copied.
+    Pending indices were stored but never audited, e.g. by an ingestion that failed before its audits were queued.
+    """
+    def __init__(self, hashes:dict[int, str], pending:set[int] | None = None):
+        self.hashes = {index: chunk_hash for index, chunk_hash in hashes.items() if chunk_hash}
+        self.pending = pending or set()
+        self.num_stored = max(hashes, default=-1) + 1
+        self.indices_by_hash = {}
+        for index, chunk_hash in self.hashes.items():
+            self.indices_by_hash.setdefault(chunk_hash, set()).add(index)
+        self.displaced = {}
+
+    def unchanged(self, index:int, chunk_hash:str) -> bool:
+        return self.hashes.get(index) == chunk_hash
+
+    def source(self, chunk_hash:str) -> int | None:
+        indices = self.indices_by_hash.get(chunk_hash)
+        return min(indices) if indices else None
+
+    def overwritten(self, index:int):
+        chunk_hash = self.hashes.pop(index, None)
+        if chunk_hash is not None:
+            self.indices_by_hash[chunk_hash].discard(index)
@@ -0,0 +1,36 @@
+import logging
+from redis_store import redis_client, async_redis_client
+
+logger = logging.getLogger(__name__)
+
+# bumped on every write to a tenant's documents, caches built on search results keep the generation
+# they were computed at and are ignored once it changes
+def generation_key(tenant:str) -> str:
+    return f"document_generation:{tenant}"
+
+# None when Redis can't be read, callers skip their cache then
+async def get_document_generation(tenant:str) -> int | None:
+    try:
+        return int(await async_redis_client.get(generation_key(tenant)) or 0)
+    except Exception as e:
+        logger.error(f"failed to read document generation of tenant {tenant}: {e}")
+        return None
+
+async def bump_document_generation(tenant:str):
+    try:
+        await async_redis_client.incr(generation_key(tenant))
+    except Exception as e:
+        logger.error(f"failed to bump document generation of tenant {tenant}: {e}")
+
+def get_document_generation_sync(tenant:str) -> int | None:
+    try:
+        return int(redis_client.get(generation_key(tenant)) or 0)
+    except Exception as e:
+        logger.error(f"failed to read document generation of tenant {tenant}: {e}")
+        return None
+
+def bump_document_generation_sync(tenant:str):
+    try:
+        redis_client.incr(generation_key(tenant))
+    except Exception as e:
+        logger.error(f"failed to bump document generation of tenant {tenant}: {e}")
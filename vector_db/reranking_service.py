@@ -0,0 +1,38 @@
+import os
+import numpy as np
+import dotenv
+
+dotenv.load_dotenv()
+
+# searches fetch limit * MMR_FETCH_MULTIPLIER candidates and keep a diverse top limit of them,
+# MMR_LAMBDA=1 keeps the plain relevance order, lower values penalize near-duplicate chunks more
+MMR_ENABLED = os.environ.get("MMR_ENABLED", "true").lower() == "true"
+MMR_LAMBDA = float(os.environ.get("MMR_LAMBDA", 0.5))
+MMR_FETCH_MULTIPLIER = int(os.environ.get("MMR_FETCH_MULTIPLIER", 4))
+
+def normalize(vectors) -> np.ndarray:
+    vectors = np.asarray(vectors, dtype=np.float32)
+    return vectors / (np.linalg.norm(vectors, axis=-1, keepdims=True) + 1e-12)
+
+def mmr_select(relevance:np.ndarray, vectors:np.ndarray, limit:int, lambda_mult:float = MMR_LAMBDA) -> list[int]:
+    """
+    Maximal marginal relevance over unit vectors, returns candidate positions in pick order.
+    Candidates come in the search's ranking order and the first one is always kept, each further pick
+    maximizes lambda * relevance - (1 - lambda) * highest similarity to the chunks already picked.
+    """
+    limit = min(limit, len(relevance))
+    if limit <= 0:
+        return []
+
+    selected = [0]
+    redundancy = vectors @ vectors[selected[0]]
+    available = np.ones(len(relevance), dtype=bool)
+    available[selected[0]] = False
+    while len(selected) < limit:
+        marginal = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        marginal[~available] = -np.inf
+        pick = int(np.argmax(marginal))
+        selected.append(pick)
+        available[pick] = False
+        np.maximum(redundancy, vectors @ vectors[pick], out=redundancy)
+    return selected
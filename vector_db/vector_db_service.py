@@ -1,5 +1,13 @@
 from qdrant_client import QdrantClient, AsyncQdrantClient, models
-from embedding import embed_text
+from embedding import embed_texts, embed_texts_sync, embed_query, embed_query_sync, sparse_embed_texts, sparse_embed_query, get_embedding_dimension, get_embedding_dimension_sync, LRUCache
+from .collection_config import collection_config, search_params, is_hybrid, TENANT_INDEX_SCHEMA, DOCUMENT_INDEX_SCHEMAS, HYBRID_SEARCH, HYBRID_PREFETCH_LIMIT, BM25_VECTOR
+from .document_generation_service import bump_document_generation, bump_document_generation_sync, get_document_generation, get_document_generation_sync
+from .document_diff import DocumentDiff, content_hash
+from .reranking_service import normalize, mmr_select, MMR_ENABLED, MMR_LAMBDA, MMR_FETCH_MULTIPLIER
+import asyncio
+import hashlib
+import numpy as np
+import math
 import uuid
 import logging
 import os
@@ -12,56 +20,257 @@ QDRANT_PORT = int(os.environ.get('QDRANT_PORT', 6333))
 QDRANT_ID_NAMESPACE = os.environ.get('QDRANT_ID_NAMESPACE', '2f3f1b4a-9d6e-4fbb-8d74-6c2f1b7c8a91')
 QDRANT_ID_NAMESPACE_UUID = uuid.UUID(QDRANT_ID_NAMESPACE)
 
-async_qdrant_client = AsyncQdrantClient(QDRANT_HOST, port=QDRANT_PORT)
+# per_tenant: one collection per tenant, shared: one collection partitioned by the tenant payload
+QDRANT_COLLECTION_LAYOUT = os.environ.get("QDRANT_COLLECTION_LAYOUT", "per_tenant")
+QDRANT_SHARED_COLLECTION = os.environ.get("QDRANT_SHARED_COLLECTION", "documents")
 
-logger = logging.getLogger(__name__)
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", 512))
+RETRIEVAL_CACHE_TTL = int(os.environ.get("RETRIEVAL_CACHE_TTL", 60))
 
+# chunks added before and after every hit, 0 returns the hits alone
+NEIGHBOR_WINDOW = int(os.environ.get("NEIGHBOR_WINDOW", 0))
 
+async_qdrant_client = AsyncQdrantClient(QDRANT_HOST, port=QDRANT_PORT)
 
+logger = logging.getLogger(__name__)
 
+def document_collection_name(tenant:str) -> str:
+    if QDRANT_COLLECTION_LAYOUT == "shared":
+        return QDRANT_SHARED_COLLECTION
+    return f"tenants_{tenant}_documents"
+
+def tenant_filter(tenant:str) -> models.Filter | None:
+    """
+    Search filter of the shared layout, a per-tenant collection needs none
+    """
+    if QDRANT_COLLECTION_LAYOUT != "shared":
+        return None
+    return models.Filter(must=[models.FieldCondition(key="tenant", match=models.MatchValue(value=tenant))])
+
+def document_filter(tenant:str, doc_id:str, from_index:int | None = None) -> models.Filter:
+    must = [models.FieldCondition(key="doc_id", match=models.MatchValue(value=doc_id))]
+    if QDRANT_COLLECTION_LAYOUT == "shared":
+        must.append(models.FieldCondition(key="tenant", match=models.MatchValue(value=tenant)))
+    if from_index is not None:
+        must.append(models.FieldCondition(key="index", range=models.Range(gte=from_index)))
+    return models.Filter(must=must)
+
+# collections known to exist in this process mapped to whether they hold BM25 vectors,
+# so uploads and searches don't ask Qdrant every time
+hybrid_collections = {}
+
+def point_vectors(embeddings:list[list[float]], texts:list[str], hybrid:bool) -> list:
+    if not hybrid:
+        return embeddings
+    return [
+        {"": embedding, BM25_VECTOR: models.SparseVector(indices=indices, values=values)}
+        for embedding, (indices, values) in zip(embeddings, sparse_embed_texts(texts))
+    ]
+
+def search_request(query:str, query_vector:list[float], tenant:str, limit:int, hybrid:bool) -> dict:
+    """
+    query_points arguments, a hybrid search runs the dense and BM25 searches as prefetches
+    and fuses them with reciprocal rank fusion in the same request.
+    With MMR the candidates are over-fetched with their dense vectors.
+    """
+    if MMR_ENABLED:
+        limit = limit * MMR_FETCH_MULTIPLIER
+    if not hybrid:
+        return {"query": query_vector, "query_filter": tenant_filter(tenant), "search_params": search_params(), "with_vectors": MMR_ENABLED, "limit": limit}
+
+    indices, values = sparse_embed_query(query)
+    prefetch_limit = max(limit, HYBRID_PREFETCH_LIMIT)
+    return {
+        "prefetch": [
+            models.Prefetch(query=query_vector, filter=tenant_filter(tenant), params=search_params(), limit=prefetch_limit),
+            models.Prefetch(query=models.SparseVector(indices=indices, values=values), using=BM25_VECTOR, filter=tenant_filter(tenant), limit=prefetch_limit),
+        ],
+        "query": models.FusionQuery(fusion=models.Fusion.RRF),
+        "with_vectors": [""],
+        "limit": limit
+    }
+
+def rank_documents(points:list, query_vector:list[float], limit:int, hybrid:bool) -> list[dict]:
+    """
+    RRF scores only reflect ranks, hybrid results report the cosine similarity
+    of their dense vector instead so scores keep the same meaning in both modes.
+    With MMR the over-fetched candidates are narrowed to a diverse top limit. The relevance
+    MMR weighs is the fused score scaled to [0, 1] over the candidates in hybrid mode, so BM25-only hits keep
+    their rank, the dense vectors only measure redundancy.
+    """
+    if not points or not (hybrid or MMR_ENABLED):
+        return to_documents(points[:limit], [point.score for point in points[:limit]])
+
+    # local Qdrant returns the unnamed vector as a list even when asked for by name
+    vectors = normalize([point.vector[""] if isinstance(point.vector, dict) else point.vector for point in points])
+    scores = vectors @ normalize(query_vector)
+    if MMR_ENABLED:
+        if hybrid:
+            fused = np.array([point.score for point in points], dtype=np.float32)
+            relevance = (fused - fused.min()) / max(float(fused.max() - fused.min()), 1e-12)
+        else:
+            relevance = scores
+        order = mmr_select(relevance, vectors, limit, MMR_LAMBDA)
+    else:
+        order = list(range(min(limit, len(points))))
+    return to_documents([points[i] for i in order], scores[order].tolist())
+
+def chunk_point_id(tenant:str, doc_id:str, idx:int) -> uuid.UUID:
+    return uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, f"{tenant}:{doc_id}:{idx}")
+
+def neighbor_windows(documents:list[dict], window:int) -> list[tuple[str, str, int, int, list[dict]]]:
+    """
+    Index ranges of ±window chunks around the hits as (tenant, doc_id, start, end, hits),
+    ranges of the same document that overlap or touch are merged into one
+    """
+    by_document = {}
+    for document in documents:
+        by_document.setdefault((document['tenant'], document['doc_id']), []).append(document)
+
+    windows = []
+    for (tenant, doc_id), hits in by_document.items():
+        hits.sort(key=lambda hit: hit['index'])
+        current = None
+        for hit in hits:
+            start, end = max(hit['index'] - window, 0), hit['index'] + window
+            if current is not None and start <= current[3] + 1:
+                current[3] = max(current[3], end)
+                current[4].append(hit)
+                continue
+            current = [tenant, doc_id, start, end, [hit]]
+            windows.append(current)
+    return [tuple(current) for current in windows]
+
+def window_point_ids(windows:list) -> list[uuid.UUID]:
+    return [
+        chunk_point_id(tenant, doc_id, idx)
+        for tenant, doc_id, start, end, _ in windows
+        for idx in range(start, end + 1)
+    ]
+
+def expand_documents(windows:list, points:list, ranked:list[dict]) -> list[dict]:
+    """
+    One document per window with the original text of its chunks in order, indices past
+    the end of the document simply don't exist. A window takes the fields of its best ranked hit
+    in the search order (ranked) and windows keep that order, so hybrid and MMR ranks survive.
+    """
+    ranks = {document['chunk_id']: rank for rank, document in enumerate(ranked)}
+    payloads = {point.payload['chunk_id']: point.payload for point in points}
+    documents = []
+    for tenant, doc_id, start, end, hits in windows:
+        best_hit = min(hits, key=lambda hit: ranks[hit['chunk_id']])
+        hit_texts = {hit['chunk_id']: hit['text'] for hit in hits}
+        chunk_ids = [f"{tenant}:{doc_id}:{idx}" for idx in range(start, end + 1)]
+        chunk_ids = [chunk_id for chunk_id in chunk_ids if chunk_id in payloads or chunk_id in hit_texts]
+        documents.append({
+            **best_hit,
+            "chunk_ids": chunk_ids,
+            "window": [start, start + len(chunk_ids) - 1] if chunk_ids else [best_hit['index'], best_hit['index']],
+            "text": "\n".join(
+                payloads[chunk_id].get('original_text') or payloads[chunk_id]['text'] if chunk_id in payloads else hit_texts[chunk_id]
+                for chunk_id in chunk_ids
+            )
+        })
+    documents.sort(key=lambda document: ranks[document['chunk_id']])
+    return documents
+
+def copied_point(tenant:str, doc_id:str, title:str, idx:int, source:models.Record) -> models.PointStruct:
+    """
+    A stored chunk moved to another index, it keeps its vector, audit and content hash
+    """
+    return models.PointStruct(
+        id=chunk_point_id(tenant, doc_id, idx),
+        vector=source.vector,
+        payload={**source.payload, "chunk_id": f"{tenant}:{doc_id}:{idx}", "index": idx, "title": title}
+    )
 
-async def search_documents(query, tenant:str, limit:int = 2) -> str:
+def to_documents(points:list, scores:list[float]) -> list[dict]:
+    return [{
+        "chunk_id": point.payload['chunk_id'],
+        "tenant": point.payload['tenant'],
+        "doc_id": point.payload['doc_id'],
+        "index": point.payload['index'],
+        "title": point.payload['title'],
+        "text": point.payload['text'],
+        "score": score
+    } for point, score in zip(points, scores)]
+
+# search results per process, the key carries the tenant's document generation so any write makes old entries unreachable
+retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE, RETRIEVAL_CACHE_TTL)
+retrieval_cache_stats = {"hits": 0, "misses": 0}
+
+def retrieval_cache_key(tenant:str, generation:int | None, query:str, limit:int, window:int) -> str | None:
+    if generation is None:
+        return None
+    query_hash = hashlib.sha256(" ".join(query.split()).encode()).hexdigest()
+    return f"{tenant}:{generation}:{limit}:{window}:{query_hash}"
+
+def cached_documents(key:str | None) -> list[dict] | None:
+    if key is None:
+        return None
+    documents = retrieval_cache.get(key)
+    if documents is None:
+        retrieval_cache_stats["misses"] += 1
+        return None
+    retrieval_cache_stats["hits"] += 1
+    return [dict(document) for document in documents]
+
+def get_retrieval_cache_stats() -> dict:
+    lookups = retrieval_cache_stats["hits"] + retrieval_cache_stats["misses"]
+    return {
+        **retrieval_cache_stats,
+        "size": len(retrieval_cache),
+        "hit_rate": retrieval_cache_stats["hits"] / lookups if lookups else 0.0
+    }
+
+async def search_documents(query, tenant:str, limit:int = 2, timeout:float | None = None, window:int | None = None) -> str:
+    """
+    timeout in seconds covers the query embedding and the Qdrant calls, an expired search returns no documents.
+    window expands every hit to its ±window neighbor chunks with one extra retrieve (default NEIGHBOR_WINDOW).
+    """
+    window = NEIGHBOR_WINDOW if window is None else window
     try:
-        query_vector = embed_text(query)
-        collection_name = f"tenants_{tenant}_documents"
-
-        search_result = await async_qdrant_client.query_points(
-            collection_name=collection_name,
-            query=query_vector,
-            with_payload=True,
-            limit= limit
-        )
+        async with asyncio.timeout(timeout):
+            cache_key = retrieval_cache_key(tenant, await get_document_generation(tenant), query, limit, window)
+            documents = cached_documents(cache_key)
+            if documents is not None:
+                return documents
 
-        documents = []
+            query_vector = await embed_query(query)
+            collection_name = document_collection_name(tenant)
+            hybrid = await collection_is_hybrid(collection_name)
 
-        logger.debug(f"Qdrant search results: {search_result}")
+            search_result = await async_qdrant_client.query_points(
+                collection_name=collection_name,
+                with_payload=True,
+                timeout=None if timeout is None else max(math.ceil(timeout), 1),
+                **search_request(query, query_vector, tenant, limit, hybrid)
+            )
+            logger.debug(f"Qdrant search results: {search_result}")
+
+            documents = rank_documents(search_result.points, query_vector, limit, hybrid)
+            if window > 0 and documents:
+                windows = neighbor_windows(documents, window)
+                neighbors = await async_qdrant_client.retrieve(collection_name=collection_name, ids=window_point_ids(windows), with_payload=True)
+                documents = expand_documents(windows, neighbors, documents)
 
-        for point in search_result.points:
-            payload = point.payload
-            documents.append({
-                "chunk_id": payload['chunk_id'],
-                "tenant": payload['tenant'],
-                "doc_id": payload['doc_id'],
-                "index": payload['index'],
-                "title": payload['title'],
-                "text": payload['text'],
-                "score": point.score
-            })
-        
         logger.debug(f"Document results: {documents}")
-        return documents
+        if cache_key is not None:
+            retrieval_cache.set(cache_key, documents)
+        return [dict(document) for document in documents]
+    except TimeoutError:
+        logger.warning(f"search_documents timed out after {timeout}s")
+        return []
     except Exception as e:
         logger.error(f"Error during search_documents: {e}")
         return []
 
-async def add_document(tenant:str, doc_id:str, title:str, chunks:list[str]):
-    collection_name = f"tenants_{tenant}_documents"
+def build_points(tenant:str, doc_id:str, title:str, chunks:list[str], embeddings:list[list[float]], start_index:int = 0, hybrid:bool = False) -> list[models.PointStruct]:
     points = []
-    for idx, chunk in enumerate(chunks):
-        text_embedding = embed_text(chunk)
+    for idx, (chunk, vector) in enumerate(zip(chunks, point_vectors(embeddings, chunks, hybrid)), start=start_index):
         point = models.PointStruct(
-            id=uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, f"{tenant}:{doc_id}:{idx}"),
-            vector=text_embedding,
+            id=chunk_point_id(tenant, doc_id, idx),
+            vector=vector,
             payload={
                 "chunk_id": f"{tenant}:{doc_id}:{idx}",
                 "tenant": tenant,
@@ -70,49 +279,178 @@ async def add_document(tenant:str, doc_id:str, title:str, chunks:list[str]):
                 "title": title,
                 "text": chunk,
                 "original_text": chunk,
+                "content_hash": content_hash(chunk),
                 "audited_text": "",
                 "audit_status": "pending",
                 "audit_version": 0
             }
         )
         points.append(point)
-
-    if not await async_qdrant_client.collection_exists(
-            collection_name=collection_name
-        ):
-            await async_qdrant_client.create_collection(
+    return points
+
+async def collection_is_hybrid(collection_name:str) -> bool:
+    if collection_name not in hybrid_collections:
+        hybrid_collections[collection_name] = is_hybrid(await async_qdrant_client.get_collection(collection_name=collection_name))
+    return hybrid_collections[collection_name]
+
+async def ensure_collection(collection_name:str):
+    if collection_name in hybrid_collections:
+        return
+    if not await async_qdrant_client.collection_exists(collection_name=collection_name):
+        await async_qdrant_client.create_collection(
+            collection_name=collection_name,
+            **collection_config(await get_embedding_dimension(), shared=collection_name == QDRANT_SHARED_COLLECTION)
+        )
+        if collection_name == QDRANT_SHARED_COLLECTION:
+            await async_qdrant_client.create_payload_index(
                 collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=2048,
-                distance=models.Distance.COSINE,
-            ),
+                field_name="tenant",
+                field_schema=TENANT_INDEX_SCHEMA
+            )
+        hybrid_collections[collection_name] = HYBRID_SEARCH
+    # also added to collections created before these indexes existed, creating an existing index is a no-op
+    for field_name, field_schema in DOCUMENT_INDEX_SCHEMAS.items():
+        await async_qdrant_client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema)
+    await collection_is_hybrid(collection_name)
+
+async def add_chunks(tenant:str, doc_id:str, title:str, chunks:list[str], start_index:int = 0, diff:DocumentDiff | None = None) -> tuple[list[int], int]:
+    """
+    Embed and upsert one batch of chunks, the collection must already exist.
+    With the diff of a re-indexed document, unchanged chunks are skipped and shifted ones are copied
+    with their vector and audit. Returns the indices that need an audit, the embedded ones and the kept or
+    copied ones that were never audited, and the number of embedded chunks.
+    """
+    collection_name = document_collection_name(tenant)
+    indices = list(range(start_index, start_index + len(chunks)))
+    hashes = [content_hash(chunk) for chunk in chunks]
+    if diff is None:
+        diff = DocumentDiff({})
+
+    changed = [(idx, chunk, chunk_hash) for idx, chunk, chunk_hash in zip(indices, chunks, hashes) if not diff.unchanged(idx, chunk_hash)]
+    changed_indices = {idx for idx, _, _ in changed}
+    audit_indices = [idx for idx in indices if idx not in changed_indices and idx in diff.pending]
+    if not changed:
+        return audit_indices, 0
+
+    # stored chunks this batch overwrites and stored chunks it can copy, fetched in one retrieve
+    overwritten = {idx for idx, _, _ in changed if idx in diff.hashes}
+    wanted = overwritten | {
+        diff.source(chunk_hash) for _, _, chunk_hash in changed
+        if chunk_hash not in diff.displaced and diff.source(chunk_hash) is not None
+    }
+    stored_points = {}
+    if wanted:
+        stored_points = {
+            point.payload['index']: point
+            for point in await async_qdrant_client.retrieve(
+                collection_name=collection_name,
+                ids=[chunk_point_id(tenant, doc_id, idx) for idx in wanted],
+                with_payload=True,
+                with_vectors=True
+            )
+        }
+
+    points = []
+    new_chunks = []
+    for idx, chunk, chunk_hash in changed:
+        source = diff.displaced.get(chunk_hash) or stored_points.get(diff.source(chunk_hash))
+        if source is not None:
+            points.append(copied_point(tenant, doc_id, title, idx, source))
+            if source.payload.get('audit_status') == "pending":
+                audit_indices.append(idx)
+        else:
+            new_chunks.append((idx, chunk))
+
+    if new_chunks:
+        text_embeddings = await embed_texts([chunk for _, chunk in new_chunks])
+        hybrid = await collection_is_hybrid(collection_name)
+        for (idx, chunk), text_embedding in zip(new_chunks, text_embeddings):
+            points.extend(build_points(tenant, doc_id, title, [chunk], [text_embedding], idx, hybrid=hybrid))
+    await async_qdrant_client.upsert(collection_name=collection_name, points=points)
+
+    for idx, _, _ in changed:
+        diff.overwritten(idx)
+        diff.pending.discard(idx)
+    diff.displaced = {
+        point.payload['content_hash']: point
+        for idx, point in stored_points.items() if idx in overwritten and point.payload.get('content_hash')
+    }
+    await bump_document_generation(tenant)
+    return sorted(audit_indices + [idx for idx, _ in new_chunks]), len(new_chunks)
+
+async def get_document_diff(tenant:str, doc_id:str) -> DocumentDiff:
+    """
+    Content hashes and unaudited indices of the stored chunks of a document,
+    one scroll over the doc_id payload index without vectors
+    """
+    hashes = {}
+    pending = set()
+    offset = None
+    while True:
+        points, offset = await async_qdrant_client.scroll(
+            collection_name=document_collection_name(tenant),
+            scroll_filter=document_filter(tenant, doc_id),
+            limit=1024,
+            offset=offset,
+            with_payload=["index", "content_hash", "audit_status"],
+            with_vectors=False
         )
-            
+        for point in points:
+            hashes[point.payload['index']] = point.payload.get('content_hash')
+            if point.payload.get('audit_status') == "pending":
+                pending.add(point.payload['index'])
+        if offset is None:
+            return DocumentDiff(hashes, pending)
+
+async def delete_chunks_from(tenant:str, doc_id:str, from_index:int):
+    """
+    Drop the chunks a shorter new version of the document no longer has
+    """
+    await async_qdrant_client.delete(
+        collection_name=document_collection_name(tenant),
+        points_selector=models.FilterSelector(filter=document_filter(tenant, doc_id, from_index)),
+        wait=True
+    )
+    await bump_document_generation(tenant)
+
+async def add_document(tenant:str, doc_id:str, title:str, chunks:list[str]) -> list[int]:
+    """
+    Index or re-index a whole document, returns the indices that need an audit
+    """
+    collection_name = document_collection_name(tenant)
+    await ensure_collection(collection_name)
+    diff = await get_document_diff(tenant, doc_id)
+    audit_indices, _ = await add_chunks(tenant=tenant, doc_id=doc_id, title=title, chunks=chunks, diff=diff)
+    if diff.num_stored > len(chunks):
+        await delete_chunks_from(tenant, doc_id, len(chunks))
+    return audit_indices
+
+async def update_points(collection_name:str, payloads:list[dict]):
+    """
+    Re-embed and write many enriched chunks with one embedding batch and one upsert.
+    The vector is built from the full chunk text (audited context + original text).
+    """
+    if not payloads:
+        return
+    texts = [payload['text'] for payload in payloads]
+    new_vectors = point_vectors(await embed_texts(texts), texts, await collection_is_hybrid(collection_name))
     await async_qdrant_client.upsert(
         collection_name=collection_name,
-        points=points
+        points=[
+            models.PointStruct(
+                id=uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, payload['chunk_id']),
+                vector=new_vector,
+                payload=payload,
+            )
+            for payload, new_vector in zip(payloads, new_vectors)
+        ],
+        wait=True,
     )
+    for tenant in {payload['tenant'] for payload in payloads}:
+        await bump_document_generation(tenant)
 
 async def update_point(chunk_id:str, collection_name:str, payload:dict):
-    point_id = uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, chunk_id)
-    new_vector = embed_text(payload['audited_text'])
-    await async_qdrant_client.upsert(
-            collection_name=collection_name,
-            points=[
-                models.PointStruct(
-                    id=point_id,
-                    vector=new_vector,
-                    payload=None,
-                )
-            ],
-            wait=True,
-    )
-
-    await async_qdrant_client.set_payload(
-        collection_name=collection_name,
-        points=[point_id],
-        payload=payload
-    )
+    await update_points(collection_name=collection_name, payloads=[{**payload, "chunk_id": chunk_id}])
 
 async def get_point(chunk_id:str, collection_name:str) -> models.PointStruct | None:
     point_id = uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, chunk_id)
@@ -125,111 +463,139 @@ async def get_point(chunk_id:str, collection_name:str) -> models.PointStruct | N
 
     return result
 
+async def get_points(chunk_ids:list[str], collection_name:str) -> dict[str, dict]:
+    """
+    Fetch many chunks in one retrieve call, returns payloads keyed by chunk_id
+    """
+    result = await async_qdrant_client.retrieve(
+        collection_name=collection_name,
+        ids=[uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, chunk_id) for chunk_id in chunk_ids],
+        with_payload=True
+    )
+
+    return {point.payload['chunk_id']: point.payload for point in result}
+
 ########################### Syncronous client #################################
 
 sync_qdrant_client = QdrantClient(QDRANT_HOST, port=QDRANT_PORT)
 
-def search_documents_sync(query, tenant:str, limit:int = 2) -> str:
+def search_documents_sync(query, tenant:str, limit:int = 2, window:int | None = None) -> str:
+    window = NEIGHBOR_WINDOW if window is None else window
     try:
-        query_vector = embed_text(query)
-        collection_name = f"tenants_{tenant}_documents"
+        cache_key = retrieval_cache_key(tenant, get_document_generation_sync(tenant), query, limit, window)
+        documents = cached_documents(cache_key)
+        if documents is not None:
+            return documents
+
+        query_vector = embed_query_sync(query)
+        collection_name = document_collection_name(tenant)
+        hybrid = collection_is_hybrid_sync(collection_name)
 
         search_result = sync_qdrant_client.query_points(
             collection_name=collection_name,
-            query=query_vector,
             with_payload=True,
-            limit= limit
+            **search_request(query, query_vector, tenant, limit, hybrid)
         )
 
-        documents = []
-
         logger.debug(f"Qdrant search results: {search_result}")
 
-        for point in search_result.points:
-            payload = point.payload
-            documents.append({
-                "chunk_id": payload['chunk_id'],
-                "tenant": payload['tenant'],
-                "doc_id": payload['doc_id'],
-                "index": payload['index'],
-                "title": payload['title'],
-                "text": payload['text'],
-                "score": point.score
-            })
-        
+        documents = rank_documents(search_result.points, query_vector, limit, hybrid)
+        if window > 0 and documents:
+            windows = neighbor_windows(documents, window)
+            neighbors = sync_qdrant_client.retrieve(collection_name=collection_name, ids=window_point_ids(windows), with_payload=True)
+            documents = expand_documents(windows, neighbors, documents)
         logger.debug(f"Document results: {documents}")
-        return documents
+        if cache_key is not None:
+            retrieval_cache.set(cache_key, documents)
+        return [dict(document) for document in documents]
     except Exception as e:
         logger.error(f"Error during search_documents: {e}")
         return []
 
-def add_document_sync(tenant:str, doc_id:str, title:str, chunks:list[str]):
-    collection_name = f"tenants_{tenant}_documents"
-    points = []
-    for idx, chunk in enumerate(chunks):
-        text_embedding = embed_text(chunk)
-        point = models.PointStruct(
-            id=uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, f"{tenant}:{doc_id}:{idx}"),
-            vector=text_embedding,
-            payload={
-                "chunk_id": f"{tenant}:{doc_id}:{idx}",
-                "tenant": tenant,
-                "doc_id": doc_id,
-                "index": idx,
-                "title": title,
-                "text": chunk,
-                "original_text": chunk,
-                "audited_text": "",
-                "audit_status": "pending",
-                "audit_version": 0
-            }
-        )
-        points.append(point)
+def collection_is_hybrid_sync(collection_name:str) -> bool:
+    if collection_name not in hybrid_collections:
+        hybrid_collections[collection_name] = is_hybrid(sync_qdrant_client.get_collection(collection_name=collection_name))
+    return hybrid_collections[collection_name]
 
-    if not sync_qdrant_client.collection_exists(
-            collection_name=collection_name
-        ):
-            sync_qdrant_client.create_collection(
-                collection_name=collection_name,
-                vectors_config=models.VectorParams(
-                    size=2048,
-                distance=models.Distance.COSINE,
-            ),
+def ensure_collection_sync(collection_name:str):
+    if collection_name in hybrid_collections:
+        return
+    if not sync_qdrant_client.collection_exists(collection_name=collection_name):
+        sync_qdrant_client.create_collection(
+            collection_name=collection_name,
+            **collection_config(get_embedding_dimension_sync(), shared=collection_name == QDRANT_SHARED_COLLECTION)
         )
-            
+        if collection_name == QDRANT_SHARED_COLLECTION:
+            sync_qdrant_client.create_payload_index(
+                collection_name=collection_name,
+                field_name="tenant",
+                field_schema=TENANT_INDEX_SCHEMA
+            )
+        hybrid_collections[collection_name] = HYBRID_SEARCH
+    for field_name, field_schema in DOCUMENT_INDEX_SCHEMAS.items():
+        sync_qdrant_client.create_payload_index(collection_name=collection_name, field_name=field_name, field_schema=field_schema)
+    collection_is_hybrid_sync(collection_name)
+
+def update_points_sync(collection_name:str, payloads:list[dict]):
+    if not payloads:
+        return
+    texts = [payload['text'] for payload in payloads]
+    new_vectors = point_vectors(embed_texts_sync(texts), texts, collection_is_hybrid_sync(collection_name))
     sync_qdrant_client.upsert(
         collection_name=collection_name,
-        points=points
+        points=[
+            models.PointStruct(
+                id=uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, payload['chunk_id']),
+                vector=new_vector,
+                payload=payload,
+            )
+            for payload, new_vector in zip(payloads, new_vectors)
+        ],
+        wait=True,
+    )
+    for tenant in {payload['tenant'] for payload in payloads}:
+        bump_document_generation_sync(tenant)
+
+def set_payloads_sync(collection_name:str, payloads:list[dict]):
+    """
+    Write payload fields of many chunks in one batch request, the vectors stay as they are.
+    Each payload holds the chunk_id and the fields to set. Meant for audit bookkeeping
+    (audit_status, document_summary, section_heading) that search results don't return, so the
+    document generation isn't bumped and cached answers stay valid, text changes go through update_points_sync.
+    """
+    if not payloads:
+        return
+    sync_qdrant_client.batch_update_points(
+        collection_name=collection_name,
+        update_operations=[
+            models.SetPayloadOperation(set_payload=models.SetPayload(
+                payload={key: value for key, value in payload.items() if key != 'chunk_id'},
+                points=[uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, payload['chunk_id'])]
+            ))
+            for payload in payloads
+        ],
+        wait=True,
     )
 
 def update_point_sync(chunk_id:str, collection_name:str, payload:dict):
+    update_points_sync(collection_name=collection_name, payloads=[{**payload, "chunk_id": chunk_id}])
+
+def get_point_sync(chunk_id:str, collection_name:str) -> models.PointStruct | None:
     point_id = uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, chunk_id)
-    new_vector = embed_text(payload['audited_text'])
-    sync_qdrant_client.upsert(
-            collection_name=collection_name,
-            points=[
-                models.PointStruct(
-                    id=point_id,
-                    vector=new_vector,
-                    payload=None,
-                )
-            ],
-            wait=True,
-    )
 
-    sync_qdrant_client.set_payload(
+    result = sync_qdrant_client.retrieve(
         collection_name=collection_name,
-        points=[point_id],
-        payload=payload
+        ids=[point_id],
+        with_payload=True
     )
 
-def get_point_sync(chunk_id:str, collection_name:str) -> models.PointStruct | None:
-    point_id = uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, chunk_id)
+    return result
 
+def get_points_sync(chunk_ids:list[str], collection_name:str) -> dict[str, dict]:
     result = sync_qdrant_client.retrieve(
         collection_name=collection_name,
-        ids=[point_id],
+        ids=[uuid.uuid5(QDRANT_ID_NAMESPACE_UUID, chunk_id) for chunk_id in chunk_ids],
         with_payload=True
     )
 
-    return result
\ No newline at end of file
+    return {point.payload['chunk_id']: point.payload for point in result}